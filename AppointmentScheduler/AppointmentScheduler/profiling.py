@@ -0,0 +1,212 @@
+"""Per-request SQL profiling: a Server-Timing header and a slow-request log.
+
+SQLProfileMiddleware profiles a random BOOKING_PROFILE_SAMPLE_RATE share of
+requests; the rate defaults to 0, so profiling is opt-in. For each profiled
+request it records:
+
+- how many queries ran and how long they took in total;
+- the duplicate groups, meaning the same SQL run DUPLICATE_THRESHOLD times
+  or more, which is the usual sign of an N+1 loop;
+- the time spent in the view, including the middleware below this one.
+
+The results go out in a ``Server-Timing`` header, so browser dev tools show
+them next to the request::
+
+    Server-Timing: db;dur=12.4;desc="31 queries", dup;desc="1 group, 24 queries", view;dur=40.2
+
+A profiled request that takes BOOKING_SLOW_REQUEST_MS or longer is also
+logged as a warning to the ``AppointmentScheduler.profiling`` logger, which
+goes wherever the project's logging config sends warnings. The entry
+includes the duplicate groups and the SLOWEST_QUERIES slowest statements,
+each with its query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere). Plans and the log entry are made in
+a request_finished receiver, once the response has been sent, so they add no
+latency to the request and are not counted in its profile. Plans are only
+taken for reads. Parameters are only logged for reads, and their text values
+are redacted, so notes, password hashes and session keys never reach the log.
+
+Recording hooks every connection once, through connection_created, rather
+than needing DEBUG's query log. A request that is not profiled pays one
+context-variable lookup per query. A profiled one keeps counters per
+distinct statement and a small heap of the slowest, whatever its query
+count. Queries run while a streamed body is being sent are not counted.
+"""
+import contextvars
+import heapq
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 0
+SLOW_REQUEST_MS = 500
+DUPLICATE_THRESHOLD = 3
+SLOWEST_QUERIES = 5
+LOGGED_GROUPS = 5
+READ_PREFIXES = ('SELECT', 'WITH')
+
+_profile = contextvars.ContextVar('sql_profile', default=None)
+# (summary line, profile) for a slow request whose response is still being sent.
+_slow = contextvars.ContextVar('slow_request', default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # sql -> [executions, seconds]
+        self.statements = {}
+        # (seconds, order, alias, sql, params), smallest first
+        self.slowest = []
+
+    def add(self, alias, sql, params, many, seconds):
+        self.count += 1
+        self.seconds += seconds
+        totals = self.statements.setdefault(sql, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        entry = (seconds, self.count, alias, sql, None if many else params)
+        if len(self.slowest) < SLOWEST_QUERIES:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def duplicates(self):
+        """(executions, seconds, sql) for each statement run DUPLICATE_THRESHOLD times or more, most first."""
+        groups = [(count, seconds, sql) for sql, (count, seconds) in self.statements.items()
+                  if count >= DUPLICATE_THRESHOLD]
+        return sorted(groups, key=lambda group: (-group[0], -group[1]))
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add(context['connection'].alias, sql, params, many, time.perf_counter() - started)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: let ``record_query`` see every query on ``connection``."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def server_timing(profile, view_seconds):
+    metrics = []
+    if profile is not None:
+        metrics.append(f'db;dur={profile.seconds * 1000:.1f};desc="{profile.count} queries"')
+        groups = profile.duplicates()
+        if groups:
+            repeated = sum(count for count, _, _ in groups)
+            metrics.append(f'dup;desc="{len(groups)} group{"s" if len(groups) != 1 else ""}, {repeated} queries"')
+    metrics.append(f'view;dur={view_seconds * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+def _is_read(sql):
+    return sql.lstrip().upper().startswith(READ_PREFIXES)
+
+
+def redact(params):
+    return tuple('?' if isinstance(value, (str, bytes, memoryview)) else value for value in params)
+
+
+def explain(alias, sql, params):
+    if params is None or not _is_read(sql):
+        return None
+    connection = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return f'(no plan: {exc})'
+    return '\n'.join(' | '.join(str(column) for column in row) for row in rows)
+
+
+def log_slow_request(summary, profile):
+    lines = [summary]
+    for count, seconds, sql in profile.duplicates()[:LOGGED_GROUPS]:
+        lines.append(f'  repeated {count}x, {seconds * 1000:.1f}ms in all: {sql}')
+    for seconds, _, alias, sql, params in sorted(profile.slowest, reverse=True):
+        lines.append(f'  {seconds * 1000:.1f}ms on {alias}: {sql}')
+        if params and _is_read(sql):
+            lines.append(f'    params: {redact(params)!r}')
+        plan = explain(alias, sql, params)
+        if plan:
+            lines.extend(f'    plan: {row}' for row in plan.splitlines())
+    logger.warning('\n'.join(lines))
+
+
+def log_finished_request(sender, **kwargs):
+    """request_finished receiver: log the slow request whose response was just sent."""
+    slow = _slow.get()
+    if slow is None:
+        return
+    _slow.set(None)
+    try:
+        log_slow_request(*slow)
+    finally:
+        # Django closed expired connections before this ran; the plans may have reopened one.
+        close_old_connections()
+
+
+def _finish(request, response, profile, view_seconds):
+    response['Server-Timing'] = server_timing(profile, view_seconds)
+    if profile is not None and _is_slow(view_seconds):
+        _slow.set((
+            f'{request.method} {request.get_full_path()} -> {response.status_code} in {view_seconds * 1000:.0f}ms: '
+            f'{profile.count} queries, {profile.seconds * 1000:.0f}ms in the database',
+            profile,
+        ))
+    return response
+
+
+def _sampled():
+    rate = getattr(settings, 'BOOKING_PROFILE_SAMPLE_RATE', SAMPLE_RATE)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _is_slow(view_seconds):
+    return view_seconds * 1000 >= getattr(settings, 'BOOKING_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+
+
+class SQLProfileMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = Profile() if _sampled() else None
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return _finish(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profile = Profile() if _sampled() else None
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return _finish(request, response, profile, time.perf_counter() - started)
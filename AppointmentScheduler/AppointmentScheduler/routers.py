@@ -0,0 +1,158 @@
+"""Send booking and users reads to read replicas, keeping each user's own writes visible.
+
+The aliases in settings.DATABASE_REPLICAS (see database.py) serve reads.
+Only reads made while a request is being handled go to them; commands and
+workers read the primary, since they often write based on what they read.
+A request reads the primary instead:
+
+- when it is not a GET, HEAD or OPTIONS, so form validation sees current data;
+- for the rest of the request once it has written anything, meaning an
+  INSERT, UPDATE or DELETE has run on the primary (``record_write``, hooked
+  into every connection like the profiler). Asking the router where a write
+  would go, as get_or_create does before it knows it needs one, is not a write;
+- inside a transaction on the primary, where the replica would be a different
+  snapshot from the one being written;
+- within ``use_primary``, which the slot claim path (claims.py) always runs in;
+- for PIN_SECONDS after the same browser's last write. ReplicaPinMiddleware
+  records that in a cookie, so a user never sees their own booking vanish
+  while the replicas catch up.
+
+Locally two SQLite files stand in for primary and replica; the
+sync_sqlite_replica command copies one to the other.
+"""
+import contextlib
+import contextvars
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ROUTED_APPS = {'booking', 'users'}
+PIN_SECONDS = 5
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# {'pinned': bool, 'wrote': bool} while a request is handled; a dict so that
+# threads running its sync code (with a copy of the context) share it.
+_request = contextvars.ContextVar('replica_request', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Read from the primary inside the block (usable as a decorator too)."""
+    state = _request.get()
+    if state is None:
+        yield
+        return
+    pinned, state['pinned'] = state['pinned'], True
+    try:
+        yield
+    finally:
+        state['pinned'] = pinned or state['wrote']
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        state = _request.get()
+        aliases = replicas()
+        if (state is None or state['pinned'] or not aliases
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects read from either may be related.
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema along with the data.
+        if db in replicas():
+            return False
+        return None
+
+
+def record_write(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    state = _request.get()
+    if (state is not None and context['connection'].alias == DEFAULT_DB_ALIAS
+            and sql.lstrip()[:7].upper().startswith(WRITE_PREFIXES)):
+        state['wrote'] = state['pinned'] = True
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: let ``record_write`` see every statement on ``connection``."""
+    if record_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_write)
+
+
+def _begin(request):
+    pinned_until = request.COOKIES.get(PIN_COOKIE, '')
+    state = {
+        'pinned': request.method not in SAFE_METHODS or (pinned_until.isdigit() and int(pinned_until) > time.time()),
+        'wrote': False,
+    }
+    _request.set(state)
+    return state
+
+
+def _finish(response, state, previous):
+    if state['wrote']:
+        response.set_cookie(PIN_COOKIE, str(int(time.time()) + PIN_SECONDS), max_age=PIN_SECONDS,
+                            httponly=True, samesite='Lax')
+    if not response.streaming:
+        _request.set(previous)
+    elif response.is_async:
+        # Streamed bodies are read after the view returns, and still belong to the request.
+        async def content(chunks=response.streaming_content):
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                _request.set(previous)
+        response.streaming_content = content()
+    else:
+        def content(chunks=response.streaming_content):
+            try:
+                yield from chunks
+            finally:
+                _request.set(previous)
+        response.streaming_content = content()
+    return response
+
+
+class ReplicaPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        previous = _request.get()
+        state = _begin(request)
+        return _finish(self.get_response(request), state, previous)
+
+    async def __acall__(self, request):
+        previous = _request.get()
+        state = _begin(request)
+        return _finish(await self.get_response(request), state, previous)
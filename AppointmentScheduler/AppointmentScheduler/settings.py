@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from . import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +48,8 @@ AUTH_USER_MODEL ='users.CustomUser'
 
 
 MIDDLEWARE = [
+    # Outermost, so its view time covers the rest of the stack.
+    'AppointmentScheduler.profiling.SQLProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'AppointmentScheduler.routers.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'AppointmentScheduler.urls'
@@ -76,14 +82,48 @@ WSGI_APPLICATION = 'AppointmentScheduler.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite with WAL and persistent connections by default; set DATABASE_URL
+# (and DATABASE_POOL) for PostgreSQL. See AppointmentScheduler/database.py.
+
+DATABASES = database.databases(BASE_DIR)
+DATABASE_REPLICAS = database.replica_aliases(DATABASES)
+DATABASE_ROUTERS = ['AppointmentScheduler.routers.ReplicaRouter']
 
-DATABASES = {
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Versioned JSON payloads live here. LocMemCache only suits a single process
+# (runserver); check --deploy fails until BOOKING_VERSION_CACHE and
+# BOOKING_CATALOG_CACHE name a shared backend such as Redis or Memcached.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'appointment-scheduler',
     }
 }
 
+# The CACHES alias holding the version counters behind every cached payload,
+# ETag and Last-Modified (booking.cache); must be shared by all processes.
+BOOKING_VERSION_CACHE = 'default'
+
+# Delivery channels for booking notifications, besides the in-app inbox; see
+# booking.outbox (EmailBackend, SMSBackend) and the deliver_notifications worker.
+BOOKING_DELIVERY_BACKENDS = []
+
+# How long before an appointment the send_reminders command reminds the customer.
+BOOKING_REMINDER_LEAD_MINUTES = [24 * 60, 60]
+
+# The CACHES alias shared by every process for the service and employee
+# catalog (booking.catalog) and its version; each process also keeps a small
+# copy in memory.
+BOOKING_CATALOG_CACHE = 'default'
+
+# SQL profiling (AppointmentScheduler.profiling), off unless enabled: the share
+# of requests that get query counts in their Server-Timing header, and how slow
+# a profiled request must be before its slowest queries and plans are logged.
+BOOKING_PROFILE_SAMPLE_RATE = float(os.environ.get('BOOKING_PROFILE_SAMPLE_RATE', 0))
+BOOKING_SLOW_REQUEST_MS = 500
+
 LOGIN_URL = 'login'               
 LOGIN_REDIRECT_URL = 'home'  # After login
 LOGOUT_REDIRECT_URL = 'login'        # After logout
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
+from .models import ScheduleException, ScheduleTemplate
+
 # Register your models here.
+
+@admin.register(ScheduleTemplate)
+class ScheduleTemplateAdmin(admin.ModelAdmin):
+    list_display = ['employee', 'weekday', 'start_time', 'end_time', 'slot_minutes', 'valid_from', 'valid_until', 'is_active']
+    list_filter = ['weekday', 'is_active']
+    list_select_related = ['employee']
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ['employee', 'start_date', 'end_date', 'reason']
+    list_select_related = ['employee']
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.backends.signals import connection_created
+
+        from AppointmentScheduler import profiling, routers
+        from AppointmentScheduler.database import apply_pragmas
+        from . import checks, signals  # noqa: F401
+
+        connection_created.connect(apply_pragmas, dispatch_uid='booking.apply_pragmas')
+        connection_created.connect(profiling.install, dispatch_uid='booking.profile_queries')
+        connection_created.connect(routers.install, dispatch_uid='booking.record_writes')
+        request_finished.connect(profiling.log_finished_request, dispatch_uid='booking.log_slow_requests')
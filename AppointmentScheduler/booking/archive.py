@@ -0,0 +1,128 @@
+"""Moving old appointments and read notifications into archive tables.
+
+The archive_booking_data command moves appointments that started before a
+cutoff (by then either completed or inactive) and read notifications
+created before another cutoff. Rows are moved in batches of a bounded size:
+each batch is copied and then deleted in one transaction, so an interrupted
+run leaves every row in exactly one table. Over time the hot tables hold
+only the active horizon, which every list, count and aggregate in
+booking.views reads.
+
+An archived appointment keeps its own id and a copy of the names and price
+it showed, so the archive needs no joins and survives the deletion of the
+rows it mentions. Deletes bypass the model signals. The derived state those
+signals keep is updated here instead:
+
+- The HomeView all-time totals are left as they are. dashboard.recompute
+  adds the archive back in, so they stay correct.
+- Each day's count is decremented, so that reconcile_dashboard sees no
+  drift.
+- reports.compute_days reads the archive for the days it covers, so the
+  closed-day rollups agree with history after a refresh.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache as booking_cache
+from . import dashboard, search
+from .models import (Appointment, AppointmentReminder, ArchivedAppointment, ArchivedNotification, Notification,
+                     OutboxMessage)
+
+BATCH_SIZE = 500
+APPOINTMENT_DAYS = 180
+NOTIFICATION_DAYS = 30
+
+APPOINTMENT_FIELDS = (
+    'id', 'user_id', 'user__username', 'employee_id', 'employee__name', 'services_id', 'services__service',
+    'services__price', 'appointment_date', 'timeslot__date', 'timeslot__start_time', 'timeslot__end_time',
+    'status', 'notes', 'created_at',
+)
+
+
+def _delete(model, ids):
+    # Raw, so Django neither collects related rows nor sends a delete signal per row.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def _archived_appointment(row):
+    return ArchivedAppointment(
+        id=row['id'], user_id=row['user_id'], username=row['user__username'],
+        employee_id=row['employee_id'], employee_name=row['employee__name'] or '',
+        service_id=row['services_id'], service_name=row['services__service'] or '',
+        price=row['services__price'], appointment_date=row['appointment_date'],
+        timeslot_date=row['timeslot__date'], timeslot_start=row['timeslot__start_time'],
+        timeslot_end=row['timeslot__end_time'], status=row['status'], notes=row['notes'],
+        created_at=row['created_at'],
+    )
+
+
+def archivable_appointments(before):
+    return Appointment.objects.filter(appointment_date__lt=before)
+
+
+def archivable_notifications(before):
+    # Notifications an outbox message may still re-deliver stay until it is done with them.
+    pending = OutboxMessage.objects.filter(status='pending', notification__isnull=False).values('notification_id')
+    return Notification.objects.filter(is_read=True, created_at__lt=before).exclude(id__in=pending)
+
+
+@transaction.atomic
+def _move_appointments(rows):
+    ids = [row['id'] for row in rows]
+    ArchivedAppointment.objects.bulk_create([_archived_appointment(row) for row in rows])
+    AppointmentReminder.objects.filter(appointment_id__in=ids).delete()
+    _delete(Appointment, ids)
+    search.remove_appointments(ids)
+    days = Counter(timezone.localdate(row['appointment_date']) for row in rows)
+    for day, count in days.items():
+        dashboard.adjust_day(day, -count)
+    keys = {booking_cache.ALL_APPOINTMENTS_KEY}
+    for row in rows:
+        keys.add(booking_cache.user_key(row['user_id']))
+        if row['employee_id'] is not None:
+            keys.add(booking_cache.employee_key(row['employee_id']))
+            keys.add(booking_cache.day_key(row['employee_id'], timezone.localdate(row['appointment_date'])))
+    transaction.on_commit(lambda: booking_cache.bump(*keys))
+
+
+def archive_appointments(before, batch_size=BATCH_SIZE):
+    """Move appointments starting before ``before`` into the archive; returns how many moved."""
+    moved = 0
+    while True:
+        rows = list(archivable_appointments(before).order_by('id').values(*APPOINTMENT_FIELDS)[:batch_size])
+        if not rows:
+            return moved
+        _move_appointments(rows)
+        moved += len(rows)
+
+
+@transaction.atomic
+def _move_notifications(rows):
+    ids = [row['id'] for row in rows]
+    ArchivedNotification.objects.bulk_create([
+        ArchivedNotification(id=row['id'], recipient_id=row['recipient_id'],
+                             notification_type=row['notification_type'], message=row['message'],
+                             created_at=row['created_at'])
+        for row in rows
+    ])
+    OutboxMessage.objects.filter(notification_id__in=ids).update(notification=None)
+    _delete(Notification, ids)
+    keys = {booking_cache.inbox_key(row['recipient_id']) for row in rows}
+    transaction.on_commit(lambda: booking_cache.bump(*keys))
+
+
+def archive_notifications(before, batch_size=BATCH_SIZE):
+    """Move read notifications created before ``before`` into the archive; returns how many moved."""
+    moved = 0
+    while True:
+        rows = list(archivable_notifications(before).order_by('id').values(
+            'id', 'recipient_id', 'notification_type', 'message', 'created_at')[:batch_size])
+        if not rows:
+            return moved
+        _move_notifications(rows)
+        moved += len(rows)
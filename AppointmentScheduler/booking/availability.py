@@ -0,0 +1,211 @@
+"""Duration-aware availability built from TimeSlot rows and existing appointments.
+
+Free slots are grouped per employee, slots overlapping an appointment are
+dropped, and adjacent or overlapping slots are merged into one free
+interval.  Each employee gets a list of intervals sorted by
+``(date, start)`` so a lookup for one day is a bisect followed by a walk
+over that day's intervals only.
+Times are handled as minutes since midnight.
+"""
+import datetime
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.utils import timezone
+
+from .models import Appointment, TimeSlot
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+class FreeInterval(NamedTuple):
+    date: datetime.date
+    start: int
+    end: int
+    # Start minute and TimeSlot id of every slot merged into this interval.
+    starts: tuple
+    slot_ids: tuple
+
+
+class Opening(NamedTuple):
+    slot_id: int
+    start_time: datetime.time
+    end_time: datetime.time
+
+
+class AvailabilityIndex:
+    def __init__(self, slots, busy=()):
+        """
+        ``slots`` yields ``(employee_id, date, slot_id, start_min, end_min)`` for
+        free slots; ``busy`` yields ``(employee_id, date, start_min, end_min)``.
+        """
+        busy_by_day = defaultdict(list)
+        for employee_id, date, start, end in busy:
+            busy_by_day[employee_id, date].append((start, end))
+        for intervals in busy_by_day.values():
+            intervals.sort()
+
+        per_employee = defaultdict(list)
+        for employee_id, date, slot_id, start, end in slots:
+            if end <= start:
+                continue
+            per_employee[employee_id].append((date, start, end, slot_id))
+
+        self._intervals = {}
+        self._keys = {}
+        for employee_id, rows in per_employee.items():
+            rows.sort()
+            intervals = self._merge(rows, busy_by_day, employee_id)
+            self._intervals[employee_id] = intervals
+            self._keys[employee_id] = [(i.date, i.start) for i in intervals]
+
+    @staticmethod
+    def _merge(rows, busy_by_day, employee_id):
+        intervals = []
+        current = None
+        busy, busy_pos, busy_date = (), 0, None
+        for date, start, end, slot_id in rows:
+            if date != busy_date:
+                busy, busy_pos, busy_date = busy_by_day.get((employee_id, date), ()), 0, date
+            # Rows and busy intervals are both sorted, so one sweep is enough.
+            while busy_pos < len(busy) and busy[busy_pos][1] <= start:
+                busy_pos += 1
+            if busy_pos < len(busy) and busy[busy_pos][0] < end:
+                continue
+            if current and current[0] == date and start <= current[2]:
+                current[2] = max(current[2], end)
+                current[3].append(start)
+                current[4].append(slot_id)
+                continue
+            if current:
+                intervals.append(FreeInterval(current[0], current[1], current[2], tuple(current[3]), tuple(current[4])))
+            current = [date, start, end, [start], [slot_id]]
+        if current:
+            intervals.append(FreeInterval(current[0], current[1], current[2], tuple(current[3]), tuple(current[4])))
+        return intervals
+
+    def free_intervals(self, employee_id, date):
+        keys = self._keys.get(employee_id)
+        if not keys:
+            return []
+        intervals = self._intervals[employee_id]
+        lo = bisect_left(keys, (date, -1))
+        hi = bisect_left(keys, (date + datetime.timedelta(days=1), -1), lo)
+        return intervals[lo:hi]
+
+    def free_slot_ids(self, employee_id, date):
+        """Ids of the free slots on ``date`` that no appointment overlaps."""
+        return {slot_id for interval in self.free_intervals(employee_id, date) for slot_id in interval.slot_ids}
+
+    def openings(self, employee_id, date, duration):
+        """Every slot start on ``date`` where ``duration`` minutes of free time follow."""
+        result = []
+        for interval in self.free_intervals(employee_id, date):
+            last = bisect_right(interval.starts, interval.end - duration)
+            for start, slot_id in zip(interval.starts[:last], interval.slot_ids[:last]):
+                result.append(Opening(slot_id, from_minutes(start), from_minutes(start + duration)))
+        return result
+
+    @classmethod
+    def from_queryset(cls, timeslots, appointments=None):
+        """Build an index from TimeSlot and Appointment querysets."""
+        slots = (_free_slot(row) for row in _free_slot_rows(timeslots).iterator(chunk_size=5000))
+        busy = ()
+        if appointments is not None:
+            busy = busy_intervals(appointments)
+        return cls(slots, busy)
+
+    @classmethod
+    async def afrom_queryset(cls, timeslots, appointments=None):
+        """``from_queryset`` for async callers; meant for a day or so of rows, which are fetched whole."""
+        # A multi-field values_list() runs its query as soon as aiterator() builds the iterable, on the
+        # event loop (Django 5.2); values() and model querysets, as in appointment_events_async, do not.
+        # Plain async iteration fetches in a worker thread instead.
+        slots = [_free_slot(row) async for row in _free_slot_rows(timeslots)]
+        busy = []
+        if appointments is not None:
+            busy = [_busy_interval(row) async for row in _busy_rows(appointments)]
+        return cls(slots, busy)
+
+    @staticmethod
+    def _day_querysets(date, employee_ids, exclude_appointment=None):
+        day_start = timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+        appointments = Appointment.objects.filter(
+            employee_id__in=employee_ids, status='active',
+            appointment_date__gte=day_start,
+            appointment_date__lt=day_start + datetime.timedelta(days=1),
+        ).exclude(pk=exclude_appointment)
+        return TimeSlot.objects.filter(employee_id__in=employee_ids, date=date), appointments
+
+    @classmethod
+    def for_day(cls, date, employee_ids, exclude_appointment=None):
+        return cls.from_queryset(*cls._day_querysets(date, employee_ids, exclude_appointment))
+
+    @classmethod
+    def for_employee_day(cls, employee_id, date, exclude_appointment=None):
+        return cls.for_day(date, [employee_id], exclude_appointment)
+
+    @classmethod
+    async def afor_employee_day(cls, employee_id, date, exclude_appointment=None):
+        return await cls.afrom_queryset(*cls._day_querysets(date, [employee_id], exclude_appointment))
+
+
+def first_available(duration, employee_ids, start_date, days, not_before=None):
+    """Yield ``(date, employee_id, Opening)`` in chronological order across employees.
+
+    Works one day at a time: each day's free slots for all candidates are
+    loaded in one query and the per-employee opening lists (already sorted)
+    are k-way merged, so callers that stop after a few results never touch
+    later days.
+    """
+    for offset in range(days):
+        date = start_date + datetime.timedelta(days=offset)
+        index = AvailabilityIndex.for_day(date, employee_ids)
+        streams = [
+            [(opening.start_time, employee_id, opening) for opening in index.openings(employee_id, date, duration)]
+            for employee_id in employee_ids
+        ]
+        for start_time, employee_id, opening in heapq.merge(*streams):
+            if not_before and datetime.datetime.combine(date, start_time) < not_before:
+                continue
+            yield date, employee_id, opening
+
+
+def _free_slot_rows(timeslots):
+    return timeslots.filter(is_available=True, is_booked=False).values_list(
+        'id', 'employee_id', 'date', 'start_time', 'end_time')
+
+
+def _free_slot(row):
+    pk, employee_id, date, start, end = row
+    return employee_id, date, pk, to_minutes(start), to_minutes(end)
+
+
+def _busy_rows(appointments):
+    return appointments.filter(employee__isnull=False).values_list(
+        'employee_id', 'appointment_date', 'services__duration', 'timeslot__start_time', 'timeslot__end_time',
+    )
+
+
+def _busy_interval(row):
+    employee_id, appointment_date, duration, slot_start, slot_end = row
+    local = timezone.localtime(appointment_date)
+    start = to_minutes(local)
+    length = duration or 0
+    if slot_start and slot_end:
+        length = max(length, to_minutes(slot_end) - to_minutes(slot_start))
+    return employee_id, local.date(), start, start + max(length, 1)
+
+
+def busy_intervals(appointments):
+    """Yield the time each active appointment occupies, using its service duration."""
+    for row in _busy_rows(appointments).iterator(chunk_size=5000):
+        yield _busy_interval(row)
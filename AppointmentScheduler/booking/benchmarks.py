@@ -0,0 +1,26 @@
+"""Helpers for the bench_* management commands."""
+import contextlib
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+
+
+@contextlib.contextmanager
+def throwaway_database():
+    """Run the block against a freshly migrated test database that is dropped afterwards."""
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    tmpdir = None
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        # Use a real file so worker threads share it; in-memory databases are per-connection.
+        tmpdir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            test_settings.pop('NAME', None)
+            shutil.rmtree(tmpdir, ignore_errors=True)
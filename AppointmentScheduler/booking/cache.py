@@ -0,0 +1,155 @@
+"""Version counters used to key cached JSON payloads and HTTP validators.
+
+Every cached payload embeds the versions it was built from, so nothing is
+ever deleted: bumping a version simply makes the old entries unreachable.
+Versions are nanosecond timestamps, which keeps them unique even after the
+cache evicts a counter and also gives us a Last-Modified value for free.
+
+The counters live in the cache named by settings.BOOKING_VERSION_CACHE,
+except the catalog's, which lives beside the catalog rows in
+settings.BOOKING_CATALOG_CACHE (see catalog.py). Every process must see the
+same counters, or a write in one leaves the others serving its old payloads
+and 304s; ``check --deploy`` refuses a per-process backend for either (see
+checks.py).
+
+The ``a``-prefixed helpers are the same operations for async views, which
+must not touch the cache or database through the blocking API.
+"""
+import datetime
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+PAYLOAD_TIMEOUT = 60 * 60
+
+
+def user_key(user_id):
+    return f'booking:v:user:{user_id}'
+
+
+def day_key(employee_id, date):
+    return f'booking:v:day:{employee_id}:{date}'
+
+
+def employee_key(employee_id):
+    return f'booking:v:employee:{employee_id}'
+
+
+def inbox_key(user_id):
+    return f'booking:v:inbox:{user_id}'
+
+
+ALL_APPOINTMENTS_KEY = 'booking:v:appointments'
+CATALOG_KEY = 'booking:v:catalog'
+
+
+def version_cache():
+    return caches[getattr(settings, 'BOOKING_VERSION_CACHE', 'default')]
+
+
+def catalog_cache():
+    return caches[getattr(settings, 'BOOKING_CATALOG_CACHE', 'default')]
+
+
+def _by_cache(keys):
+    """``keys`` grouped by the cache that holds their counters."""
+    groups = {}
+    for key in keys:
+        counters = catalog_cache() if key == CATALOG_KEY else version_cache()
+        groups.setdefault(counters, []).append(key)
+    return groups
+
+
+def bump(*keys):
+    now = time.time_ns()
+    for counters, group in _by_cache(keys).items():
+        counters.set_many({key: now for key in group}, VERSION_TIMEOUT)
+
+
+def _get_versions(counters, keys):
+    versions = counters.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # First sight (or evicted): start from "now" so stale payloads built
+        # under an earlier value can never be matched again.
+        now = time.time_ns()
+        for key in missing:
+            counters.add(key, now, VERSION_TIMEOUT)
+        versions.update(counters.get_many(missing))
+        # A full cache may already have culled them again; "now" is still a safe, fresh version.
+        for key in missing:
+            versions.setdefault(key, now)
+    return versions
+
+
+def get_versions(*keys):
+    versions = {}
+    for counters, group in _by_cache(keys).items():
+        versions.update(_get_versions(counters, group))
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*keys):
+    # One thread hop for the lot: BaseCache.aget_many would take one per key.
+    return await sync_to_async(get_versions)(*keys)
+
+
+def etag_for(*parts):
+    digest = hashlib.sha1(':'.join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def last_modified_for(versions):
+    return datetime.datetime.fromtimestamp(max(versions) / 1e9, tz=datetime.timezone.utc)
+
+
+def cache_stream(chunks, key):
+    """Yield ``chunks`` through unchanged and store the joined body once complete."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), PAYLOAD_TIMEOUT)
+
+
+async def acache_stream(chunks, key):
+    """``cache_stream`` for an async iterator of chunks."""
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    await cache.aset(key, ''.join(parts), PAYLOAD_TIMEOUT)
+
+
+def async_condition(etag_func, last_modified_func=None):
+    """``django.views.decorators.http.condition`` for async views with async validator functions.
+
+    The stock decorator calls the validators synchronously, which would run
+    their permission and cache lookups on the event loop.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = None
+            if last_modified_func and (dt := await last_modified_func(request, *args, **kwargs)):
+                last_modified = int(dt.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
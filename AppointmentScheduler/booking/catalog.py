@@ -0,0 +1,108 @@
+"""Services and employees, cached in process and in a shared cache.
+
+Every booking form lists all services and employees, and the service and
+employee lists show them too, yet they change a few times a week. The
+catalog keeps their rows under the catalog version from cache.py, which is
+itself kept in the shared cache below:
+
+1. a small per-process LRU, which answers nearly every lookup without
+   leaving the process;
+2. the Django cache named by settings.BOOKING_CATALOG_CACHE (default
+   ``'default'``), shared by every process, so a new process does not
+   start with a query;
+3. the database, read once per version.
+
+Saving or deleting a Service or Employee bumps the version (see
+signals.py), and so does a bulk import (transfer.py). Every entry built
+for the old version becomes unreachable everywhere at once. Callers get
+fresh model instances each time, so nothing they change leaks into the
+cache.
+"""
+import threading
+from collections import OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS
+
+from . import cache as booking_cache
+from .models import Employee, Service
+
+LOCAL_ENTRIES = 16
+ORDERINGS = {
+    Service: ('service', 'id'),
+    Employee: ('name', 'id'),
+}
+
+
+class LRU:
+    """A thread-safe mapping that forgets the least recently used entry beyond ``size``."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = LRU(LOCAL_ENTRIES)
+
+
+def shared_cache():
+    return booking_cache.catalog_cache()
+
+
+def _field_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _rows(model):
+    version, = booking_cache.get_versions(booking_cache.CATALOG_KEY)
+    key = f'booking:catalog:{model._meta.model_name}:{version}'
+    rows = _local.get(key)
+    if rows is None:
+        rows = shared_cache().get(key)
+        if rows is None:
+            rows = list(model.objects.order_by(*ORDERINGS[model]).values_list(*_field_names(model)))
+            shared_cache().set(key, rows, booking_cache.PAYLOAD_TIMEOUT)
+        _local.set(key, rows)
+    return rows
+
+
+def _instances(model):
+    names = _field_names(model)
+    return [model.from_db(DEFAULT_DB_ALIAS, names, row) for row in _rows(model)]
+
+
+def services():
+    """Every Service, by name."""
+    return _instances(Service)
+
+
+def employees():
+    """Every Employee, active or not, by name."""
+    return _instances(Employee)
+
+
+def active_employees():
+    return [employee for employee in employees() if employee.is_active]
+
+
+def invalidate():
+    booking_cache.bump(booking_cache.CATALOG_KEY)
+    _local.clear()
@@ -0,0 +1,38 @@
+"""System checks for settings the booking app cannot work correctly without."""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can see.
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def _process_local(setting):
+    alias = getattr(settings, setting, 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return (alias, backend) if backend in PROCESS_LOCAL_BACKENDS else None
+
+
+@register(Tags.caches, deploy=True)
+def check_version_cache(app_configs, **kwargs):
+    local = _process_local('BOOKING_VERSION_CACHE')
+    if local is None:
+        return []
+    return [Error(
+        f'BOOKING_VERSION_CACHE ({local[0]!r}) uses {local[1]}, which each process keeps to itself.',
+        hint=('Cached payload versions (booking.cache) must be shared by every process, or a write in one '
+              'leaves the others serving stale pages; point it at Redis, Memcached or the database cache.'),
+        id='booking.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_catalog_cache(app_configs, **kwargs):
+    local = _process_local('BOOKING_CATALOG_CACHE')
+    if local is None:
+        return []
+    return [Error(
+        f'BOOKING_CATALOG_CACHE ({local[0]!r}) uses {local[1]}, which each process keeps to itself.',
+        hint=('The catalog version (booking.catalog) lives there, so a renamed service or employee would '
+              'stay stale in every other process; point it at Redis, Memcached or the database cache.'),
+        id='booking.E002',
+    )]
@@ -0,0 +1,124 @@
+"""Atomic TimeSlot claiming for every path that books, moves or cancels an appointment.
+
+A booking claims its slot and every other slot of that employee's day its
+service overlaps, with a single conditional UPDATE (``... WHERE is_booked = 0``).
+Unless every one of them was free, the claim fails and is undone. Two concurrent
+bookings of the same or overlapping times can therefore never both succeed.
+The claim and the Appointment write share one transaction, so a failed
+insert releases it. The appointment records the ids it claimed, and moving
+or cancelling it releases exactly those, whatever has happened to the
+service's duration since.
+The customer's notification is queued in the same transaction (see outbox.py),
+and so is the entry in the live availability log (see live.py).
+Every read on this path goes to the primary database, never a replica
+(see AppointmentScheduler/routers.py).
+"""
+import contextlib
+import datetime
+
+from django.db import transaction
+from django.db.models import Q
+
+from AppointmentScheduler.routers import use_primary
+
+from . import cache as booking_cache
+from . import catalog
+from . import live
+from . import outbox
+from .models import TimeSlot
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def _bump_day(slot):
+    # QuerySet.update() sends no signals, so invalidate the cached day ourselves.
+    key = booking_cache.day_key(slot.employee_id, slot.date)
+    transaction.on_commit(lambda: booking_cache.bump(key))
+
+
+def service_duration(service_id):
+    for service in catalog.services():
+        if service.pk == service_id:
+            return service.duration
+    return None
+
+
+def covered_slot_ids(slot, duration=None):
+    """``slot`` and the other slots of its day that a ``duration``-minute booking starting there overlaps."""
+    if not duration:
+        return [slot.pk]
+    start = datetime.datetime.combine(slot.date, slot.start_time)
+    end = start + datetime.timedelta(minutes=duration)
+    end_time = end.time() if end.date() == slot.date else datetime.time.max
+    overlapping = Q(employee_id=slot.employee_id, date=slot.date, start_time__lt=end_time,
+                    end_time__gt=slot.start_time)
+    return list(TimeSlot.objects.filter(overlapping | Q(pk=slot.pk)).values_list('pk', flat=True))
+
+
+def claimed_slot_ids(appointment):
+    """The slots ``appointment`` holds; recomputed for rows saved before it recorded them."""
+    if appointment.claimed_slot_ids or not appointment.timeslot_id:
+        return list(appointment.claimed_slot_ids)
+    return covered_slot_ids(appointment.timeslot, service_duration(appointment.services_id))
+
+
+def claim_slot(slot, duration=None, ids=None):
+    """Claim ``slot`` and the slots a ``duration``-minute booking there covers; return their ids."""
+    ids = covered_slot_ids(slot, duration) if ids is None else ids
+    # Around several rows, a savepoint undoes a partial claim even if the caller carries on.
+    with transaction.atomic() if len(ids) > 1 else contextlib.nullcontext():
+        if TimeSlot.objects.filter(pk__in=ids, is_booked=False).update(is_booked=True) != len(ids):
+            raise SlotUnavailable(slot.pk)
+    slot.is_booked = True
+    _bump_day(slot)
+    for pk in ids:
+        live.record('slot.booked', slot.employee_id, slot.date, pk)
+    return ids
+
+
+def release_slot(slot, ids):
+    TimeSlot.objects.filter(pk__in=ids).update(is_booked=False)
+    slot.is_booked = False
+    _bump_day(slot)
+    for pk in ids:
+        live.record('slot.released', slot.employee_id, slot.date, pk)
+
+
+@use_primary()
+@transaction.atomic
+def save_appointment(form, previous_slot=None):
+    """Save a validated AppointmentForm, moving the slot claim with it.
+
+    Raises SlotUnavailable (and rolls everything back) if the chosen slot was
+    taken after the form was validated.
+    """
+    slot = form.cleaned_data.get('timeslot')
+    service = form.cleaned_data.get('services')
+    previous_ids = claimed_slot_ids(form.instance) if previous_slot else []
+    ids = covered_slot_ids(slot, service.duration if service else None) if slot else []
+    if set(ids) != set(previous_ids):
+        # Release first, so a move within the old booking's own time can claim it again.
+        if previous_slot:
+            release_slot(previous_slot, previous_ids)
+        if slot:
+            claim_slot(slot, ids=ids)
+    form.instance.claimed_slot_ids = ids
+    created = form.instance.pk is None
+    moved = not created and {'timeslot', 'appointment_date'} & set(form.changed_data)
+    appointment = form.save()
+    if created:
+        outbox.enqueue(appointment, 'BOOKING_CONFIRMIATION')
+    elif moved:
+        outbox.enqueue(appointment, 'RESCHEDULE')
+    return appointment
+
+
+@use_primary()
+@transaction.atomic
+def cancel_appointment(appointment):
+    if appointment.timeslot_id:
+        release_slot(appointment.timeslot, claimed_slot_ids(appointment))
+    outbox.enqueue(appointment, 'CANCELLATION')
+    appointment.delete()
@@ -0,0 +1,149 @@
+"""Incrementally maintained HomeView totals.
+
+Signal handlers in booking.signals call ``adjust``/``adjust_day`` with
+deltas as appointments, employees and service prices change, so the
+dashboard reads a handful of rows instead of aggregating whole tables.
+``reconcile`` recomputes everything from scratch and reports drift, e.g.
+after bulk_create() or raw SQL, which bypass signals. The all-time totals
+include appointments moved to the archive (see archive.py); per-day counts
+cover only the live table.
+
+The upcoming count is a counter too, covering appointments from its
+``as_of`` day on. ``adjust_day`` only moves it for days it still covers.
+The first ``read`` of a new day rolls it forward, subtracting the per-day
+counts of the days that have ended, so a read costs the days since the
+previous read (normally one) rather than every future day.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Appointment, AppointmentDayCount, ArchivedAppointment, DashboardCounter, Employee, Service
+
+TOTAL_APPOINTMENTS = 'appointments_total'
+ACTIVE_REVENUE = 'active_revenue'
+ACTIVE_EMPLOYEES = 'active_employees'
+UPCOMING_APPOINTMENTS = 'upcoming_appointments'
+COUNTERS = (TOTAL_APPOINTMENTS, ACTIVE_REVENUE, ACTIVE_EMPLOYEES, UPCOMING_APPOINTMENTS)
+
+
+def _upsert(queryset, create, **delta):
+    updates = {field: F(field) + value for field, value in delta.items()}
+    if queryset.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            create(**delta)
+    except IntegrityError:
+        # Someone else created the row first; apply our delta to theirs.
+        queryset.update(**updates)
+
+
+def adjust(name, delta):
+    if delta:
+        _upsert(DashboardCounter.objects.filter(name=name),
+                lambda value: DashboardCounter.objects.create(name=name, value=value), value=delta)
+
+
+def adjust_day(date, delta):
+    if delta and date is not None:
+        _upsert(AppointmentDayCount.objects.filter(date=date),
+                lambda count: AppointmentDayCount.objects.create(date=date, count=count), count=delta)
+        # Until read() first creates it, the upcoming counter has nothing to adjust.
+        DashboardCounter.objects.filter(name=UPCOMING_APPOINTMENTS, as_of__lte=date).update(value=F('value') + delta)
+
+
+def _days_total(**lookup):
+    return AppointmentDayCount.objects.filter(**lookup).aggregate(total=Sum('count'))['total'] or 0
+
+
+@transaction.atomic
+def _roll_upcoming(today):
+    """Move the upcoming counter's window to start ``today``; return its value."""
+    counter = DashboardCounter.objects.select_for_update().filter(name=UPCOMING_APPOINTMENTS).first()
+    if counter is None:
+        # First use: one sum over the future days, then only ever the ended ones.
+        total = _days_total(date__gte=today)
+        try:
+            with transaction.atomic():
+                DashboardCounter.objects.create(name=UPCOMING_APPOINTMENTS, value=total, as_of=today)
+        except IntegrityError:
+            return _roll_upcoming(today)
+        return total
+    if counter.as_of < today:
+        counter.value -= _days_total(date__gte=counter.as_of, date__lt=today)
+        counter.as_of = today
+        counter.save(update_fields=['value', 'as_of', 'updated_at'])
+    return int(counter.value)
+
+
+def read(today=None):
+    today = today or timezone.localdate()
+    counters = {name: (value, as_of) for name, value, as_of in
+                DashboardCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value', 'as_of')}
+    values = {name: value for name, (value, _) in counters.items()}
+    upcoming, as_of = counters.get(UPCOMING_APPOINTMENTS, (None, None))
+    if as_of is None or as_of < today:
+        upcoming = _roll_upcoming(today)
+    elif as_of > today:
+        # Asked about a day the counter has already rolled past.
+        upcoming = _days_total(date__gte=today)
+    return {
+        'total_appointments': int(values.get(TOTAL_APPOINTMENTS, 0)),
+        'upcoming_appointments': int(upcoming),
+        'total_employees': int(values.get(ACTIVE_EMPLOYEES, 0)),
+        'total_revenue': values.get(ACTIVE_REVENUE, Decimal('0')),
+    }
+
+
+def recompute(today=None):
+    today = today or timezone.localdate()
+    revenue = Appointment.objects.filter(status='active').aggregate(total=Sum('services__price'))['total']
+    archived = ArchivedAppointment.objects.aggregate(n=Count('id'), revenue=Sum('price', filter=Q(status='active')))
+    counters = {
+        TOTAL_APPOINTMENTS: Decimal(Appointment.objects.count() + archived['n']),
+        ACTIVE_REVENUE: (revenue or Decimal('0')) + (archived['revenue'] or Decimal('0')),
+        ACTIVE_EMPLOYEES: Decimal(Employee.objects.filter(is_active=True).count()),
+    }
+    days = dict(
+        Appointment.objects.annotate(day=TruncDate('appointment_date'))
+        .values('day').annotate(n=Count('id')).values_list('day', 'n')
+    )
+    counters[UPCOMING_APPOINTMENTS] = Decimal(sum(count for date, count in days.items() if date >= today))
+    return counters, days
+
+
+@transaction.atomic
+def reconcile(fix=True):
+    """Compare the stored totals against a full recount; return ``{name: (stored, actual)}`` for mismatches."""
+    today = timezone.localdate()
+    read(today)  # roll the upcoming counter to today, so it compares like for like
+    counters, days = recompute(today)
+    drift = {}
+    stored = dict(DashboardCounter.objects.select_for_update().values_list('name', 'value'))
+    for name, actual in counters.items():
+        if stored.get(name, Decimal('0')) != actual:
+            drift[name] = (stored.get(name, Decimal('0')), actual)
+    stored_days = dict(AppointmentDayCount.objects.exclude(count=0).values_list('date', 'count'))
+    for date in set(stored_days) | set(days):
+        if stored_days.get(date, 0) != days.get(date, 0):
+            drift[f'day {date}'] = (stored_days.get(date, 0), days.get(date, 0))
+
+    if fix and drift:
+        for name, value in counters.items():
+            as_of = today if name == UPCOMING_APPOINTMENTS else None
+            DashboardCounter.objects.update_or_create(name=name, defaults={'value': value, 'as_of': as_of})
+        AppointmentDayCount.objects.all().delete()
+        AppointmentDayCount.objects.bulk_create(
+            AppointmentDayCount(date=date, count=count) for date, count in days.items()
+        )
+    return drift
+
+
+def service_price(service_id):
+    if service_id is None:
+        return Decimal('0')
+    return Service.objects.filter(pk=service_id).values_list('price', flat=True).first() or Decimal('0')
@@ -0,0 +1,157 @@
+"""iCalendar (RFC 5545) subscription feeds for customers and employees.
+
+Calendar apps cannot log in, so each CalendarFeed carries an unguessable
+token and the token in the URL is the credential; rotating it cuts off
+every app subscribed to the old one. A feed covers its owner's appointments
+from PAST_DAYS ago to FUTURE_DAYS ahead, read off the (user,
+appointment_date) or (employee, appointment_date) index and written out
+one VEVENT at a time, so a long history never sits in memory.
+
+Clients poll every hour or so, and the answer is almost always "nothing
+changed". The ETag is built from the owner's appointment version and the
+catalog version (see cache.py) plus today's date, which moves the window,
+so a conditional GET costs one token lookup and one cache read and is
+answered 304 without touching the appointments.
+"""
+import datetime
+
+from django.utils import timezone
+
+from . import cache as booking_cache
+from .models import Appointment, CalendarFeed
+
+PAST_DAYS = 30
+FUTURE_DAYS = 365
+REFRESH_INTERVAL = 'PT1H'
+PRODID = '-//AppointmentScheduler//Booking//EN'
+UID_DOMAIN = 'appointment-scheduler'
+DEFAULT_MINUTES = 60
+CHUNK_SIZE = 500
+
+
+def feed_for(user=None, employee=None):
+    """The owner's feed, created on first use."""
+    owner = {'user': user} if user is not None else {'employee': employee}
+    # A plain read first, so showing an existing feed neither writes nor pins the request to the primary.
+    feed = CalendarFeed.objects.filter(**owner).first()
+    if feed is None:
+        feed = CalendarFeed.objects.get_or_create(**owner)[0]
+    return feed
+
+
+def rotate(feed):
+    """Give ``feed`` a new token; apps subscribed to the old URL get 404 from now on."""
+    feed.token = CalendarFeed._meta.get_field('token').get_default()
+    feed.save(update_fields=['token'])
+    return feed
+
+
+def owner_key(feed):
+    if feed.user_id:
+        return booking_cache.user_key(feed.user_id)
+    return booking_cache.employee_key(feed.employee_id)
+
+
+def versions(feed):
+    # Service and employee names appear in every SUMMARY.
+    return booking_cache.get_versions(owner_key(feed), booking_cache.CATALOG_KEY)
+
+
+def etag(feed, versions, today=None):
+    kind = f'user-{feed.user_id}' if feed.user_id else f'employee-{feed.employee_id}'
+    return booking_cache.etag_for('ics', kind, feed.token, today or timezone.localdate(), *versions)
+
+
+def appointments(feed, today=None):
+    today = today or timezone.localdate()
+    start = timezone.make_aware(datetime.datetime.combine(today - datetime.timedelta(days=PAST_DAYS),
+                                                          datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(today + datetime.timedelta(days=FUTURE_DAYS + 1),
+                                                        datetime.time.min))
+    owner = {'user_id': feed.user_id} if feed.user_id else {'employee_id': feed.employee_id}
+    return (
+        Appointment.objects.filter(appointment_date__gte=start, appointment_date__lt=end, **owner)
+        .values('id', 'status', 'notes', 'appointment_date', 'updated_at', 'sequence',
+                'timeslot__date', 'timeslot__start_time', 'timeslot__end_time',
+                'services__service', 'services__duration', 'employee__name',
+                'user__username', 'user__first_name', 'user__last_name')
+        .order_by('appointment_date', 'id')
+    )
+
+
+def escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces, as RFC 5545 requires, without breaking a character."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Back off to the start of a UTF-8 character.
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        pieces.append(encoded[start:end].decode())
+        start, limit = end, 74  # continuation lines start with a space
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def utc(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _times(row):
+    if row['timeslot__date']:
+        start = timezone.make_aware(datetime.datetime.combine(row['timeslot__date'], row['timeslot__start_time']))
+        end = timezone.make_aware(datetime.datetime.combine(row['timeslot__date'], row['timeslot__end_time']))
+        return start, end
+    minutes = row['services__duration'] or DEFAULT_MINUTES
+    return row['appointment_date'], row['appointment_date'] + datetime.timedelta(minutes=minutes)
+
+
+def _event(feed, row, stamp):
+    start, end = _times(row)
+    service = row['services__service'] or 'Appointment'
+    if feed.user_id:
+        summary = f"{service} with {row['employee__name']}" if row['employee__name'] else service
+    else:
+        customer = f"{row['user__first_name']} {row['user__last_name']}".strip() or row['user__username']
+        summary = f'{service} for {customer}'
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:appointment-{row['id']}@{UID_DOMAIN}",
+        f'DTSTAMP:{stamp}',
+        f"LAST-MODIFIED:{utc(row['updated_at'])}",
+        f"SEQUENCE:{row['sequence']}",
+        f'DTSTART:{utc(start)}',
+        f'DTEND:{utc(end)}',
+        f'SUMMARY:{escape(summary)}',
+        f"STATUS:{'CONFIRMED' if row['status'] == 'active' else 'CANCELLED'}",
+    ]
+    if row['notes']:
+        lines.append(f"DESCRIPTION:{escape(row['notes'])}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def render(feed, name, today=None):
+    """Yield the calendar a VEVENT at a time."""
+    # For METHOD:PUBLISH, DTSTAMP is when the calendar was generated.
+    stamp = utc(timezone.now())
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}',
+        f'X-PUBLISHED-TTL:{REFRESH_INTERVAL}',
+    ))
+    for row in appointments(feed, today).iterator(chunk_size=CHUNK_SIZE):
+        yield _event(feed, row, stamp)
+    yield 'END:VCALENDAR\r\n'
@@ -1,7 +1,11 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator
 from .models import Appointment, Service, Employee, TimeSlot, Notification
+from .availability import AvailabilityIndex
+from . import catalog
 from django.db import models
 from django.utils import timezone
+from django.contrib.auth import get_user_model
 
    
 class TailwindFormMixin:
@@ -14,6 +18,62 @@ class TailwindFormMixin:
             else:
                 field.widget.attrs['class'] = 'block w-full rounded-md border-0 py-1.5 text-gray-900 shadow-sm ring-1 ring-inset ring-gray-300 placeholder:text-gray-400 focus:ring-2 focus:ring-inset focus:ring-blue-600 sm:text-sm sm:leading-6 pl-2 ' + current_classes
 
+class CatalogChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.catalog_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.catalog_objects()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.catalog_objects())
+
+
+class CatalogChoiceField(forms.ModelChoiceField):
+    """A ModelChoiceField whose options, and the submitted choice, come from catalog.py.
+
+    A warm form renders and validates without querying. A pk missing from the
+    catalog is looked up in ``queryset`` as usual, and is rejected if it is not there.
+    """
+    iterator = CatalogChoiceIterator
+    catalog = None
+    _catalog_objects = None
+
+    def __deepcopy__(self, memo):
+        # Each form gets its own copy of the field, and reads the catalog afresh.
+        result = super().__deepcopy__(memo)
+        result._catalog_objects = None
+        return result
+
+    def catalog_objects(self):
+        """The catalog's instances, read once per field however often the choices are listed."""
+        if self._catalog_objects is None:
+            self._catalog_objects = self.catalog()
+        return self._catalog_objects
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return super().to_python(value)
+        key = self.to_field_name or 'pk'
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, key)
+        for obj in self.catalog_objects():
+            if str(getattr(obj, key)) == str(value):
+                return obj
+        return super().to_python(value)
+
+
+class ServiceChoiceField(CatalogChoiceField):
+    catalog = staticmethod(catalog.services)
+
+
+class EmployeeChoiceField(CatalogChoiceField):
+    catalog = staticmethod(catalog.employees)
+
+
 class ServiceForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
          model = Service
@@ -23,21 +83,71 @@ class TimeSlotForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = TimeSlot
         fields = ['employee', 'date', 'start_time', 'end_time']
+        field_classes = {'employee': EmployeeChoiceField}
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date'}),
             'start_time': forms.TimeInput(attrs={'type': 'time'}),
             'end_time': forms.TimeInput(attrs={'type': 'time'}),
         }
 
+class TimeSlotGenerateForm(TailwindFormMixin, forms.Form):
+    MAX_DAYS = 366
+
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    employees = forms.ModelMultipleChoiceField(
+        queryset=Employee.objects.filter(is_active=True), required=False,
+        help_text="Leave empty to generate for every employee with a schedule template.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start and end:
+            if start > end:
+                self.add_error('end_date', "End date must be on or after the start date.")
+            elif (end - start).days >= self.MAX_DAYS:
+                self.add_error('end_date', f"Generate at most {self.MAX_DAYS} days at a time.")
+        return cleaned_data
+
 class EmployeeForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = Employee
         fields = ['name', 'specialization', 'email', 'phone_number', 'years_experience', 'bio', 'is_active']
 
+class ScopedChoiceIterator(ModelChoiceIterator):
+    def __init__(self, field):
+        super().__init__(field)
+        self.queryset = field.queryset.none() if field.choice_queryset is None else field.choice_queryset
+
+
+class TimeSlotChoiceField(forms.ModelChoiceField):
+    """A TimeSlot picker whose options are one employee's day, not every slot.
+
+    ``queryset`` is only used to look up the submitted pk, so validating costs
+    one query whatever the table size; the rendered options come from
+    ``choice_queryset``, set by ``limit_to_day()``. The booking form's AJAX
+    loader replaces them whenever the employee or date changes.
+    """
+    iterator = ScopedChoiceIterator
+    choice_queryset = None
+
+    def limit_to_day(self, employee_id, date, include=None):
+        free = models.Q(employee_id=employee_id, date=date, is_booked=False, is_available=True)
+        if include:
+            free |= models.Q(pk=include)
+        self.choice_queryset = self.queryset.filter(free).order_by('date', 'start_time')
+        self.widget.choices = self.choices
+
+
 class AppointmentForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = Appointment
         fields = ['employee', 'services', 'appointment_date', 'timeslot', 'status', 'notes']
+        field_classes = {
+            'employee': EmployeeChoiceField,
+            'services': ServiceChoiceField,
+            'timeslot': TimeSlotChoiceField,
+        }
         widgets = {
              'appointment_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
@@ -45,24 +155,44 @@ class AppointmentForm(TailwindFormMixin, forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['appointment_date'].required = False
-        # Filter to show only unbooked timeslots, plus the current one if we are editing
-        if self.instance and self.instance.pk and self.instance.timeslot:
-            self.fields['timeslot'].queryset = TimeSlot.objects.filter(models.Q(is_booked=False) | models.Q(pk=self.instance.timeslot.pk))
-        elif 'timeslot' in self.data:
+        # The slot this appointment holds before the edit; claims.save_appointment releases it.
+        self.original_timeslot = self.instance.timeslot if self.instance.pk else None
+        # TimeSlot.__str__ reads employee.name, so join it for the <select> options
+        timeslot_field = self.fields['timeslot']
+        timeslot_field.queryset = TimeSlot.objects.select_related('employee')
+        employee_id, date = self._chosen_day()
+        if employee_id and date:
+            timeslot_field.limit_to_day(employee_id, date, include=self.instance.timeslot_id)
+
+    def _chosen_day(self):
+        """The employee and date the timeslot options are for: the submitted ones, else the instance's."""
+        if self.is_bound:
+            employee_id = self.data.get(self.add_prefix('employee'))
             try:
-                timeslot_id = int(self.data.get('timeslot'))
-                self.fields['timeslot'].queryset = TimeSlot.objects.filter(models.Q(is_booked=False) | models.Q(pk=timeslot_id))
-            except (ValueError, TypeError):
-                self.fields['timeslot'].queryset = TimeSlot.objects.filter(is_booked=False)
-        else:
-             self.fields['timeslot'].queryset = TimeSlot.objects.none()
+                when = self.fields['appointment_date'].clean(self.data.get(self.add_prefix('appointment_date')))
+            except forms.ValidationError:
+                when = None
+            if not str(employee_id or '').isdigit() or when is None:
+                return None, None
+            return int(employee_id), timezone.localtime(when).date()
+        if self.original_timeslot:
+            return self.original_timeslot.employee_id, self.original_timeslot.date
+        return None, None
 
     def clean(self):
         cleaned_data = super().clean()
         timeslot = cleaned_data.get('timeslot')
+        service = cleaned_data.get('services')
         appointment_date = cleaned_data.get('appointment_date')
 
         if timeslot:
+            employee = cleaned_data.get('employee')
+            if employee and timeslot.employee_id != employee.pk:
+                self.add_error('timeslot', "This time slot belongs to another employee.")
+                return cleaned_data
+            if appointment_date and timezone.localtime(appointment_date).date() != timeslot.date:
+                self.add_error('timeslot', "This time slot is on a different date.")
+                return cleaned_data
             # If a timeslot is selected, override appointment_date with timeslot's datetime
             import datetime
             # Combine date and time
@@ -78,6 +208,15 @@ class AppointmentForm(TailwindFormMixin, forms.ModelForm):
                     pass
                 else:
                     self.add_error('timeslot', "This time slot has already been booked.")
+            elif self.instance.timeslot_id != timeslot.pk:
+                index = AvailabilityIndex.for_employee_day(
+                    timeslot.employee_id, timeslot.date, exclude_appointment=self.instance.pk)
+                if service and service.duration:
+                    openings = index.openings(timeslot.employee_id, timeslot.date, service.duration)
+                    if timeslot.pk not in {opening.slot_id for opening in openings}:
+                        self.add_error('timeslot', f"{service} needs {service.duration} minutes, which does not fit at this time.")
+                elif timeslot.pk not in index.free_slot_ids(timeslot.employee_id, timeslot.date):
+                    self.add_error('timeslot', "This time slot overlaps another appointment.")
         elif not appointment_date:
              self.add_error('appointment_date', "Please select a time slot OR enter a manual date/time.")
         
@@ -86,4 +225,23 @@ class AppointmentForm(TailwindFormMixin, forms.ModelForm):
 class NotificationForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = Notification
-        fields =['recipient', 'message', 'is_read']
\ No newline at end of file
+        fields =['recipient', 'message', 'is_read']
+
+
+class NotificationBroadcastForm(TailwindFormMixin, forms.Form):
+    AUDIENCES = (
+        ('all', 'Everyone'),
+        ('customers', 'Customers'),
+        ('staff', 'Staff'),
+    )
+
+    audience = forms.ChoiceField(choices=AUDIENCES)
+    notification_type = forms.ChoiceField(choices=Notification.NOTIFICATION_TYPES)
+    message = forms.CharField(widget=forms.Textarea)
+
+    def recipient_ids(self):
+        users = get_user_model().objects.filter(is_active=True)
+        audience = self.cleaned_data['audience']
+        if audience != 'all':
+            users = users.filter(is_staff=audience == 'staff')
+        return users.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=2000)
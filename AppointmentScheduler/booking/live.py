@@ -0,0 +1,314 @@
+"""Live slot availability for the server-sent events stream.
+
+Every change to a TimeSlot's availability, and every appointment saved or
+cancelled, is written to the SlotChange log in the transaction that makes
+it (booking.signals, plus claims.py and scheduling.py for their UPDATE and
+bulk_create paths). Once that transaction commits the change is published
+to this process's broker, which hands it to every subscriber whose
+employee/date/kind filter matches.
+
+A subscription can be scoped to one customer (``user_id``): it then gets
+appointment changes only for that customer's own appointments, and slot
+changes only when it follows particular employees, as the booking form does.
+The view scopes every viewer who may not see all appointments.
+
+A subscriber is an asyncio queue on the event loop serving its stream, so
+an idle connection costs a coroutine and a queue rather than a thread and
+one ASGI worker can hold thousands. Browsers reconnect with Last-Event-ID
+(the SlotChange id) and the stream replays what they missed from the log
+before going live; when it cannot (too much missed, or pruned) it sends a
+``reset`` event and the page re-fetches. Changes committed by other
+processes reach the broker through a tail of the log, one query every
+BOOKING_LIVE_POLL_SECONDS for the whole process.
+
+A WSGI worker cannot hold such a stream: it would buffer the endless async
+body and never send a byte. Under WSGI the view serves ``poll_stream``
+instead, which reads the log itself for BOOKING_LIVE_WSGI_SECONDS and then
+ends, and the browser reconnects with its Last-Event-ID.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import SlotChange
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+CATCH_UP_LIMIT = 500
+POLL_SECONDS = 2
+WSGI_STREAM_SECONDS = 25
+TAIL_BATCH = 1000
+RECENT_IDS = 10000
+RESET = object()
+
+
+def poll_seconds():
+    return getattr(settings, 'BOOKING_LIVE_POLL_SECONDS', POLL_SECONDS)
+
+
+def wsgi_stream_seconds():
+    return getattr(settings, 'BOOKING_LIVE_WSGI_SECONDS', WSGI_STREAM_SECONDS)
+
+
+def _event(change):
+    return {
+        'id': change.pk,
+        'kind': change.kind,
+        'employee_id': change.employee_id,
+        'date': change.date.isoformat(),
+        'timeslot_id': change.timeslot_id,
+        'appointment_id': change.appointment_id,
+        'user_id': change.user_id,
+    }
+
+
+def _is_slot_change(kind):
+    return kind.startswith('slot.')
+
+
+class Subscription:
+    def __init__(self, employee_ids, dates, loop, maxsize=QUEUE_SIZE, kinds=(), user_id=None):
+        self.employee_ids = frozenset(employee_ids)
+        self.dates = frozenset(date.isoformat() for date in dates)
+        self.kinds = frozenset(kinds)
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def visible(self, event):
+        if self.user_id is None or event['user_id'] == self.user_id:
+            return True
+        return bool(self.employee_ids) and _is_slot_change(event['kind'])
+
+    def matches(self, event):
+        return ((not self.employee_ids or event['employee_id'] in self.employee_ids)
+                and (not self.dates or event['date'] in self.dates)
+                and (not self.kinds or event['kind'] in self.kinds)
+                and self.visible(event))
+
+    def deliver(self, event):
+        # Runs on the subscriber's loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A reader this far behind is told to re-fetch instead.
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return RESET
+        return await self.queue.get()
+
+
+class Broker:
+    """Fans committed changes out to the subscribers in this process; thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_employee = defaultdict(set)
+        self._everyone = set()
+        self._recent = deque()
+        self._recent_ids = set()
+        self._tail = None
+
+    def subscribe(self, employee_ids=(), dates=(), kinds=(), user_id=None):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(employee_ids, dates, loop, kinds=kinds, user_id=user_id)
+        with self._lock:
+            if subscription.employee_ids:
+                for employee_id in subscription.employee_ids:
+                    self._by_employee[employee_id].add(subscription)
+            else:
+                self._everyone.add(subscription)
+            if poll_seconds() and (self._tail is None or self._tail.done() or self._tail.get_loop() is not loop):
+                self._tail = loop.create_task(self._follow_log())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._everyone.discard(subscription)
+            for employee_id in subscription.employee_ids:
+                subscribers = self._by_employee.get(employee_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_employee[employee_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._everyone | set().union(*self._by_employee.values()))
+
+    def publish(self, event):
+        with self._lock:
+            # The same change can arrive from on_commit and from the log tail.
+            if event['id'] in self._recent_ids:
+                return
+            self._recent.append(event['id'])
+            self._recent_ids.add(event['id'])
+            if len(self._recent) > RECENT_IDS:
+                self._recent_ids.discard(self._recent.popleft())
+            targets = self._everyone | self._by_employee.get(event['employee_id'], set())
+        for subscription in targets:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:
+                    # Its loop has closed; the stream is gone.
+                    self.unsubscribe(subscription)
+
+    async def _follow_log(self):
+        cursor = (await SlotChange.objects.aaggregate(last=Max('id')))['last'] or 0
+        while self.subscriber_count():
+            await asyncio.sleep(poll_seconds())
+            try:
+                async for change in SlotChange.objects.filter(id__gt=cursor).order_by('id')[:TAIL_BATCH]:
+                    self.publish(_event(change))
+                    cursor = change.pk
+            except Exception:
+                logger.exception('Reading the slot change log failed')
+
+
+broker = Broker()
+
+
+def record(kind, employee_id, date, timeslot_id=None, appointment_id=None, user_id=None):
+    """Log a change in the current transaction and publish it once that commits."""
+    if employee_id is None or date is None:
+        return None
+    change = SlotChange.objects.create(kind=kind, employee_id=employee_id, date=date,
+                                       timeslot_id=timeslot_id, appointment_id=appointment_id, user_id=user_id)
+    event = _event(change)
+    transaction.on_commit(lambda: broker.publish(event))
+    return change
+
+
+def record_days(kind, days, user_id=None):
+    """Log one change per ``(employee_id, date)``, for bulk paths that touch many slots."""
+    changes = SlotChange.objects.bulk_create(
+        [SlotChange(kind=kind, employee_id=employee_id, date=date, user_id=user_id)
+         for employee_id, date in sorted(days)])
+    events = [_event(change) for change in changes]
+
+    def publish():
+        for event in events:
+            broker.publish(event)
+    transaction.on_commit(publish)
+
+
+def _changes_after(last_id, employee_ids=(), dates=(), kinds=(), user_id=None):
+    changes = SlotChange.objects.filter(id__gt=last_id)
+    if employee_ids:
+        changes = changes.filter(employee_id__in=employee_ids)
+    if dates:
+        changes = changes.filter(date__in=dates)
+    if kinds:
+        changes = changes.filter(kind__in=kinds)
+    if user_id is not None:
+        # The same rule as Subscription.visible.
+        visible = Q(user_id=user_id)
+        if employee_ids:
+            visible |= Q(kind__startswith='slot.')
+        changes = changes.filter(visible)
+    return changes.order_by('id')
+
+
+async def missed_since(last_id, employee_ids=(), dates=(), limit=CATCH_UP_LIMIT, kinds=(), user_id=None):
+    """Changes after ``last_id`` matching the filter, or None if the log can no longer tell."""
+    oldest = (await SlotChange.objects.aaggregate(oldest=Min('id')))['oldest']
+    if oldest is not None and oldest > last_id + 1:
+        return None
+    changes = _changes_after(last_id, employee_ids, dates, kinds, user_id)
+    rows = [_event(change) async for change in changes[:limit + 1]]
+    return rows if len(rows) <= limit else None
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(employee_ids=(), dates=(), last_event_id=None, heartbeat=HEARTBEAT_SECONDS, kinds=(), user_id=None):
+    """The text/event-stream body: catch-up from the log, then live changes until disconnect."""
+    subscription = broker.subscribe(employee_ids, dates, kinds, user_id)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        replayed = set()
+        if last_event_id is not None:
+            missed = await missed_since(last_event_id, employee_ids, dates, kinds=kinds, user_id=user_id)
+            if missed is None:
+                yield 'event: reset\ndata: {}\n\n'
+            else:
+                for event in missed:
+                    replayed.add(event['id'])
+                    yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is RESET:
+                yield 'event: reset\ndata: {}\n\n'
+            elif event['id'] not in replayed:
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def poll_stream(employee_ids=(), dates=(), last_event_id=None, seconds=None, kinds=(), user_id=None):
+    """``stream`` for WSGI workers: polls the log for ``seconds``, then ends so the browser reconnects."""
+    seconds = wsgi_stream_seconds() if seconds is None else seconds
+    deadline = time.monotonic() + seconds
+    yield f'retry: {RETRY_MILLISECONDS}\n\n'
+    bounds = SlotChange.objects.aggregate(oldest=Min('id'), newest=Max('id'))
+    cursor = last_event_id
+    if cursor is None or (bounds['oldest'] is not None and bounds['oldest'] > cursor + 1):
+        if cursor is not None:
+            yield 'event: reset\ndata: {}\n\n'
+        cursor = bounds['newest'] or 0
+        # An id-only message sets the browser's Last-Event-ID, so the reconnect resumes from here.
+        yield f'id: {cursor}\n\n'
+    sent = time.monotonic()
+    while True:
+        events = [_event(change) for change in
+                  _changes_after(cursor, employee_ids, dates, kinds, user_id)[:CATCH_UP_LIMIT + 1]]
+        if len(events) > CATCH_UP_LIMIT:
+            cursor = SlotChange.objects.aggregate(newest=Max('id'))['newest']
+            yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+            sent = time.monotonic()
+        elif events:
+            cursor = events[-1]['id']
+            yield ''.join(format_event(event) for event in events)
+            sent = time.monotonic()
+        elif time.monotonic() - sent >= HEARTBEAT_SECONDS:
+            yield ': keepalive\n\n'
+            sent = time.monotonic()
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return
+        time.sleep(min(poll_seconds() or POLL_SECONDS, left))
+
+
+def prune(days=7):
+    """Delete log entries older than ``days``; returns how many were removed."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    newest = SlotChange.objects.aggregate(newest=Max('id'))['newest']
+    # Keep the newest row so ids never restart, which would strand clients' Last-Event-IDs.
+    return SlotChange.objects.filter(created_at__lt=cutoff, id__lt=newest or 0).delete()[0]
@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from booking import archive
+
+
+class Command(BaseCommand):
+    help = ('Move appointments older than --appointment-days and read notifications older than '
+            '--notification-days into the archive tables, in batches of --batch-size.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointment-days', type=int, default=archive.APPOINTMENT_DAYS)
+        parser.add_argument('--notification-days', type=int, default=archive.NOTIFICATION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Count what would be moved without moving it.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        appointments_before = now - datetime.timedelta(days=options['appointment_days'])
+        notifications_before = now - datetime.timedelta(days=options['notification_days'])
+        if options['dry_run']:
+            appointments = archive.archivable_appointments(appointments_before).count()
+            notifications = archive.archivable_notifications(notifications_before).count()
+            verb = 'Would archive'
+        else:
+            appointments = archive.archive_appointments(appointments_before, options['batch_size'])
+            notifications = archive.archive_notifications(notifications_before, options['batch_size'])
+            verb = 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {appointments:,} appointments before {appointments_before:%Y-%m-%d} '
+            f'and {notifications:,} read notifications before {notifications_before:%Y-%m-%d}.'))
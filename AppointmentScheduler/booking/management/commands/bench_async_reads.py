@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import io
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.utils import timezone
+
+from booking.benchmarks import throwaway_database
+from booking.models import Appointment, Employee, Service, TimeSlot
+
+HOST = 'localhost'
+
+
+def _p99(timings):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+async def asgi_get(app, path, query, cookie):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; the handler cancels this once it has responded.
+        await asyncio.Future()
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+def wsgi_get(app, path, query, cookie):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    result = app(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = ('Load the calendar events and load-timeslots endpoints with many concurrent clients: '
+            'their async routes through the ASGI handler, and the default sync views through the '
+            'WSGI handler on a thread pool.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--wsgi-threads', type=int, default=64,
+                            help='Worker threads of the simulated WSGI server.')
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--employees', type=int, default=50)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Sleep this long in every query, to model a database across the network.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with throwaway_database():
+            requests = self.seed(rng, options)
+            latency = options['db_latency_ms'] / 1000
+
+            def add_latency(sender, connection, **kwargs):
+                connection.execute_wrappers.append(
+                    lambda execute, *args: time.sleep(latency) or execute(*args))
+            if latency:
+                connection_created.connect(add_latency, weak=False)
+            results = {}
+            try:
+                for label, run in (('WSGI', self.run_wsgi), ('ASGI', self.run_asgi)):
+                    cache.clear()
+                    results[label] = run(requests, options)
+            finally:
+                connection_created.disconnect(add_latency)
+
+        for label, (elapsed, timings, errors) in results.items():
+            self.stdout.write(f'{label}: {len(timings) / elapsed:,.0f} req/s, '
+                              f'p99 {_p99(timings) * 1000:.1f}ms, {errors} errors')
+
+    def seed(self, rng, options):
+        User = get_user_model()
+        customers = User.objects.bulk_create([User(username=f'bench-{n}') for n in range(options['customers'])])
+        employees = Employee.objects.bulk_create([
+            Employee(name=f'Employee {n}', email=f'e{n}@example.com', specialization='Hair', years_experience=1, bio='')
+            for n in range(options['employees'])
+        ])
+        services = Service.objects.bulk_create([Service(service=f'Service {n}', duration=30 * (n % 3 + 1))
+                                                for n in range(10)])
+        first_day = timezone.localdate() + datetime.timedelta(days=1)
+        days = [first_day + datetime.timedelta(days=n) for n in range(options['days'])]
+        slots = TimeSlot.objects.bulk_create([
+            TimeSlot(employee=employee, date=day, start_time=datetime.time(9 + n // 2, 30 * (n % 2)),
+                     end_time=datetime.time(9 + (n + 1) // 2, 30 * ((n + 1) % 2)))
+            for employee in employees for day in days for n in range(16)
+        ], batch_size=5000)
+        booked = rng.sample(slots, len(slots) // 4)
+        Appointment.objects.bulk_create([
+            Appointment(user=rng.choice(customers), employee_id=slot.employee_id, services=rng.choice(services),
+                        timeslot=slot, notes='', appointment_date=timezone.make_aware(
+                            datetime.datetime.combine(slot.date, slot.start_time)))
+            for slot in booked
+        ], batch_size=5000)
+        TimeSlot.objects.filter(pk__in=[slot.pk for slot in booked]).update(is_booked=True)
+
+        cookies = []
+        for customer in customers:
+            client = Client()
+            client.force_login(customer)
+            cookies.append(f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}')
+
+        requests = []
+        for _ in range(options['requests']):
+            day = rng.choice(days)
+            if rng.random() < 0.5:
+                requests.append(('/appointments/calendar/events/',
+                                 f'start={day}&end={day + datetime.timedelta(days=7)}', rng.choice(cookies)))
+            else:
+                requests.append(('/appointments/ajax/load-timeslots/',
+                                 f'employee_id={rng.choice(employees).pk}&date={day}'
+                                 f'&service_id={rng.choice(services).pk}', ''))
+        self.stdout.write(f'{len(slots):,} slots, {len(booked):,} appointments, {len(requests):,} requests')
+        return requests
+
+    def run_asgi(self, requests, options):
+        app = get_asgi_application()
+        pending = iter(requests)
+        timings, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            for path, query, cookie in pending:
+                began = time.perf_counter()
+                status = await asgi_get(app, f'{path}async/', query, cookie)
+                timings.append(time.perf_counter() - began)
+                errors += status >= 400
+
+        async def main():
+            await asyncio.gather(*(client() for _ in range(options['clients'])))
+
+        started = time.perf_counter()
+        asyncio.run(main())
+        return time.perf_counter() - started, timings, errors
+
+    def run_wsgi(self, requests, options):
+        app = get_wsgi_application()
+        pending = iter(requests)
+        lock, finished = threading.Lock(), threading.Event()
+        timings, errors, open_clients = [], 0, options['clients']
+
+        def client(server):
+            # Each client keeps one request in flight and sends the next when it completes;
+            # latency includes the wait for a free worker thread.
+            nonlocal open_clients
+            with lock:
+                request = next(pending, None)
+                if request is None:
+                    open_clients -= 1
+                    if not open_clients:
+                        finished.set()
+                    return
+            began = time.perf_counter()
+
+            def done(future):
+                nonlocal errors
+                with lock:
+                    timings.append(time.perf_counter() - began)
+                    errors += future.exception() is not None or future.result() >= 400
+                client(server)
+
+            server.submit(wsgi_get, app, *request).add_done_callback(done)
+
+        with ThreadPoolExecutor(options['wsgi_threads']) as server:
+            started = time.perf_counter()
+            for _ in range(options['clients']):
+                client(server)
+            finished.wait()
+            elapsed = time.perf_counter() - started
+        return elapsed, timings, errors
@@ -0,0 +1,62 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking.availability import AvailabilityIndex
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AvailabilityIndex lookups against a linear scan on synthetic slots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=200)
+        parser.add_argument('--days', type=int, default=250)
+        parser.add_argument('--slots-per-day', type=int, default=20)
+        parser.add_argument('--queries', type=int, default=10000)
+        parser.add_argument('--scan-queries', type=int, default=20,
+                            help='Lookups to run through the linear-scan baseline.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        first_day = datetime.date(2026, 1, 1)
+        days = [first_day + datetime.timedelta(days=i) for i in range(options['days'])]
+
+        slots, busy = [], []
+        slot_id = 0
+        for employee_id in range(1, options['employees'] + 1):
+            for date in days:
+                for n in range(options['slots_per_day']):
+                    start = 8 * 60 + n * 30
+                    slot_id += 1
+                    slots.append((employee_id, date, slot_id, start, start + 30))
+                # A couple of appointments per day punch holes in the free time.
+                for _ in range(2):
+                    start = 8 * 60 + rng.randrange(options['slots_per_day']) * 30
+                    busy.append((employee_id, date, start, start + 45))
+        self.stdout.write(f'{len(slots):,} slots, {len(busy):,} appointments')
+
+        started = time.perf_counter()
+        index = AvailabilityIndex(slots, busy)
+        self.stdout.write(f'index build: {time.perf_counter() - started:.2f}s')
+
+        lookups = [
+            (rng.randint(1, options['employees']), rng.choice(days), rng.choice((30, 60, 90)))
+            for _ in range(options['queries'])
+        ]
+        started = time.perf_counter()
+        found = sum(len(index.openings(*lookup)) for lookup in lookups)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'index: {len(lookups):,} lookups in {elapsed:.3f}s '
+            f'({elapsed / len(lookups) * 1e6:.1f}us each, {found:,} openings)'
+        )
+
+        started = time.perf_counter()
+        for employee_id, date, _ in lookups[:options['scan_queries']]:
+            [row for row in slots if row[0] == employee_id and row[1] == date]
+        elapsed = time.perf_counter() - started
+        count = min(options['scan_queries'], len(lookups))
+        self.stdout.write(f'linear scan: {count:,} lookups in {elapsed:.3f}s ({elapsed / max(count, 1) * 1e6:.1f}us each)')
@@ -0,0 +1,118 @@
+import datetime
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from AppointmentScheduler import database
+from booking.benchmarks import throwaway_database
+from booking.claims import SlotUnavailable, claim_slot
+from booking.models import Appointment, Employee, Service, TimeSlot
+
+# SQLite as Django sets it up by default: rollback journal, fsync on every commit,
+# deferred transactions and a new connection per request.
+DEFAULT_PROFILE = {
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {},
+    'PRAGMAS': {'journal_mode': 'delete', 'synchronous': 'full'},
+}
+
+
+def _p99(timings):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * 0.99))] if timings else 0
+
+
+class Command(BaseCommand):
+    help = ('Book slots from many threads at once against a file-backed SQLite database, with the default '
+            'connection settings and then with the tuned profile from AppointmentScheduler/database.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16)
+        parser.add_argument('--bookings', type=int, default=200, help='Bookings per writer.')
+        parser.add_argument('--no-read-first', dest='read_first', action='store_false',
+                            help='Claim without first reading the slot in the same transaction.')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            if connection.vendor != 'sqlite':
+                self.stderr.write('This benchmark compares SQLite profiles; DATABASE_URL points elsewhere.')
+                return
+            tuned = database.sqlite_database(connection.settings_dict['NAME'])
+            profiles = (
+                ('default', DEFAULT_PROFILE),
+                ('tuned', {key: tuned[key] for key in DEFAULT_PROFILE}),
+            )
+            for label, profile in profiles:
+                slots = self.seed(label, options)
+                elapsed, timings, errors = self.run(profile, slots, options)
+                self.stdout.write(
+                    f'{label}: {len(timings) / elapsed:,.0f} bookings/s, p99 {_p99(timings) * 1000:.1f}ms, '
+                    f'{errors} "database is locked" errors')
+
+    def seed(self, label, options):
+        User = get_user_model()
+        employee = Employee.objects.create(name=label, email=f'{label}@example.com', specialization='Hair',
+                                           years_experience=1, bio='')
+        day = timezone.localdate() + datetime.timedelta(days=1)
+        count = options['writers'] * options['bookings']
+        slots = TimeSlot.objects.bulk_create([
+            TimeSlot(employee=employee, date=day + datetime.timedelta(days=n // 48),
+                     start_time=datetime.time(n % 48 // 2, 30 * (n % 2)),
+                     end_time=(datetime.datetime.combine(day, datetime.time(n % 48 // 2, 30 * (n % 2)))
+                               + datetime.timedelta(minutes=30)).time())
+            for n in range(count)
+        ], batch_size=1000)
+        self.user = User.objects.create(username=f'bench-{label}')
+        self.service = Service.objects.create(service=f'Service {label}', duration=30, price=10)
+        return [slots[n::options['writers']] for n in range(options['writers'])]
+
+    def run(self, profile, slots, options):
+        settings_dict = connections.settings['default']
+        saved = {key: settings_dict.get(key) for key in profile}
+        settings_dict.update(profile)
+        connection.close()
+        timings, errors, lock = [], 0, threading.Lock()
+
+        def writer(own):
+            nonlocal errors
+            for slot in own:
+                began = time.perf_counter()
+                try:
+                    self.book(slot, options['read_first'])
+                except OperationalError:
+                    with lock:
+                        errors += 1
+                    continue
+                finally:
+                    # Like a request boundary: persistent connections are kept, the rest closed.
+                    connection.close_if_unusable_or_obsolete()
+                with lock:
+                    timings.append(time.perf_counter() - began)
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(own,)) for own in slots]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        settings_dict.update(saved)
+        connection.close()
+        return elapsed, timings, errors
+
+    def book(self, slot, read_first):
+        with transaction.atomic():
+            if read_first:
+                slot = TimeSlot.objects.get(pk=slot.pk)
+            try:
+                claim_slot(slot)
+            except SlotUnavailable:
+                return
+            Appointment.objects.create(
+                user=self.user, employee_id=slot.employee_id, services=self.service, timeslot=slot, notes='',
+                appointment_date=timezone.make_aware(datetime.datetime.combine(slot.date, slot.start_time)))
@@ -0,0 +1,67 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from booking.benchmarks import throwaway_database
+from booking.models import Employee, Service, TimeSlot
+from booking.views import first_available_slots
+
+
+class Command(BaseCommand):
+    help = 'Measure first-available search latency across many employees in a throwaway database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=300)
+        parser.add_argument('--days', type=int, default=14)
+        parser.add_argument('--slots-per-day', type=int, default=16)
+        parser.add_argument('--booked', type=float, default=0.8,
+                            help='Fraction of slots already booked.')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        with throwaway_database():
+            user = get_user_model().objects.create_user('bench-first-available')
+            services = [Service.objects.create(service=f'S{m}', duration=m) for m in (30, 60, 90)]
+            employees = Employee.objects.bulk_create([
+                Employee(name=f'E{n}', email=f'e{n}@example.com', specialization=('Hair', 'Nails')[n % 2],
+                         years_experience=1, bio='')
+                for n in range(options['employees'])
+            ])
+            today = timezone.localdate()
+            batch = []
+            for employee in employees:
+                for day in range(options['days']):
+                    for n in range(options['slots_per_day']):
+                        start = datetime.datetime.combine(today, datetime.time(8)) + datetime.timedelta(minutes=30 * n)
+                        batch.append(TimeSlot(employee=employee, date=today + datetime.timedelta(days=day + 1),
+                                              start_time=start.time(),
+                                              end_time=(start + datetime.timedelta(minutes=30)).time(),
+                                              is_booked=rng.random() < options['booked']))
+                if len(batch) > 10000:
+                    TimeSlot.objects.bulk_create(batch)
+                    batch = []
+            TimeSlot.objects.bulk_create(batch)
+            self.stdout.write(f"{options['employees']} employees, {TimeSlot.objects.count():,} slots")
+
+            factory = RequestFactory()
+            timings = []
+            for _ in range(options['requests']):
+                params = {'service_id': rng.choice(services).pk, 'limit': 5}
+                if rng.random() < 0.5:
+                    params['specialization'] = 'Hair'
+                request = factory.get('/appointments/ajax/first-available/', params)
+                request.user = user
+                started = time.perf_counter()
+                first_available_slots(request)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(f'{len(timings)} requests: p50 {statistics.median(timings):.1f}ms, p99 {p99:.1f}ms')
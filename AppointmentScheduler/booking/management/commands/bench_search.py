@@ -0,0 +1,85 @@
+import datetime
+import random
+import statistics
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from booking import search
+from booking.benchmarks import throwaway_database
+from booking.models import Appointment, Employee, Service
+
+WORDS = ('cut', 'colour', 'trim', 'fade', 'beard', 'wash', 'style', 'perm', 'curl', 'blow', 'dry', 'shave')
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+class Command(BaseCommand):
+    help = 'Compare the full-text index against the icontains LIKE path for list-view searches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=200000)
+        parser.add_argument('--employees', type=int, default=500)
+        parser.add_argument('--services', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        # Free-text notes draw on a wide vocabulary, so most terms are selective.
+        vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))) for _ in range(20000)]
+        with throwaway_database():
+            if not search.tokenizer():
+                self.stderr.write('This database has no FTS5 search index; nothing to compare.')
+                return
+            user = get_user_model().objects.create_user('bench-search')
+            services = Service.objects.bulk_create([
+                Service(service=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {n}', duration=30)
+                for n in range(options['services'])
+            ])
+            employees = Employee.objects.bulk_create([
+                Employee(name=f'{rng.choice(vocabulary).title()} {rng.choice(vocabulary).title()}', email=f'e{n}@example.com',
+                         specialization=rng.choice(WORDS), years_experience=1, bio='')
+                for n in range(options['employees'])
+            ])
+            start = timezone.now()
+            for offset in range(0, options['appointments'], 10000):
+                Appointment.objects.bulk_create([
+                    Appointment(user=user, employee=rng.choice(employees), services=rng.choice(services),
+                                appointment_date=start + datetime.timedelta(minutes=n),
+                                notes=' '.join(rng.choices(vocabulary, k=8)))
+                    for n in range(offset, min(offset + 10000, options['appointments']))
+                ])
+            started = time.perf_counter()
+            search.rebuild()
+            self.stdout.write(f"{options['appointments']:,} appointments indexed in "
+                              f"{time.perf_counter() - started:.1f}s ({search.tokenizer()} tokenizer)")
+
+            # A mix of what staff type: employee names, service words and words from notes.
+            names = [employee.name for employee in employees]
+            terms = [
+                rng.choice((rng.choice(names), rng.choice(names).split()[0][:4], rng.choice(WORDS), rng.choice(vocabulary)))
+                for _ in range(options['queries'])
+            ]
+            base = Appointment.objects.select_related('services', 'employee')
+            size = options['page_size']
+            results = {}
+            for label, run in (
+                ('LIKE', lambda q: list(search.like_filter(base, q).order_by('appointment_date', 'id')[:size])),
+                ('FTS5', lambda q: list(search.search(base, q)[0][:size])),
+            ):
+                timings = []
+                for term in terms:
+                    began = time.perf_counter()
+                    run(term)
+                    timings.append((time.perf_counter() - began) * 1000)
+                results[label] = _percentiles(timings)
+
+        for label, (p50, p99) in results.items():
+            self.stdout.write(f'{label}: p50 {p50:.1f}ms, p99 {p99:.1f}ms')
@@ -0,0 +1,100 @@
+import datetime
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from booking.benchmarks import throwaway_database
+from booking.claims import SlotUnavailable, claim_slot
+from booking.models import Appointment, Employee, TimeSlot
+
+
+def contend_for_slots(slots, workers, user, retries=50):
+    """Have ``workers`` threads race to book every slot; return the run's statistics."""
+    won, lost, retried = [0] * workers, [0] * workers, [0] * workers
+    barrier = threading.Barrier(workers)
+
+    def book(slot):
+        with transaction.atomic():
+            claim_slot(slot)
+            Appointment.objects.create(
+                user=user, employee_id=slot.employee_id, timeslot_id=slot.pk, notes='',
+                appointment_date=timezone.make_aware(datetime.datetime.combine(slot.date, slot.start_time)),
+            )
+
+    def worker(n):
+        order = list(slots)
+        random.Random(n).shuffle(order)
+        barrier.wait()
+        try:
+            for template in order:
+                for _ in range(retries):
+                    slot = TimeSlot(pk=template.pk, employee_id=template.employee_id,
+                                    date=template.date, start_time=template.start_time)
+                    try:
+                        book(slot)
+                        won[n] += 1
+                    except SlotUnavailable:
+                        lost[n] += 1
+                    except OperationalError:
+                        # SQLite reports contention as "database is locked"; back off and retry.
+                        retried[n] += 1
+                        time.sleep(0.001 * random.random())
+                        continue
+                    break
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    double_booked = (
+        Appointment.objects.filter(timeslot__in=[slot.pk for slot in slots])
+        .values('timeslot').annotate(n=Count('id')).filter(n__gt=1).count()
+    )
+    return {
+        'claimed': sum(won),
+        'lost': sum(lost),
+        'retried': sum(retried),
+        'double_booked': double_booked,
+        'seconds': elapsed,
+        'attempts_per_second': (sum(won) + sum(lost)) / elapsed if elapsed else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Race threads for the same TimeSlots in a throwaway test database and report conflicts and throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            user = get_user_model().objects.create_user('bench-claims')
+            employee = Employee.objects.create(name='Bench', email='bench@example.com',
+                                               specialization='', years_experience=0, bio='')
+            day = datetime.date(2030, 1, 1)
+            slots = TimeSlot.objects.bulk_create([
+                TimeSlot(employee=employee, date=day + datetime.timedelta(days=n // 20),
+                         start_time=datetime.time(8 + (n % 20) // 2, 30 * (n % 2)),
+                         end_time=datetime.time(8 + (n % 20) // 2, 30 * (n % 2) + 29))
+                for n in range(options['slots'])
+            ])
+            stats = contend_for_slots(slots, options['workers'], user)
+        self.stdout.write(
+            f"{options['workers']} workers x {options['slots']} slots: {stats['claimed']} claimed, "
+            f"{stats['lost']} lost races, {stats['retried']} lock retries, "
+            f"{stats['double_booked']} double bookings, "
+            f"{stats['attempts_per_second']:,.0f} claim attempts/sec"
+        )
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued booking notifications from the outbox, reporting throughput and queue lag.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--lease-seconds', type=int, default=outbox.LEASE_SECONDS)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--report-every', type=float, default=30.0,
+                            help='Seconds between throughput and lag reports.')
+        parser.add_argument('--once', action='store_true', help='Drain the due messages and exit.')
+
+    def handle(self, *args, **options):
+        backends = outbox.get_backends()
+        totals = [0, 0, 0]
+        started = last_report = time.monotonic()
+        try:
+            while True:
+                counts = outbox.process_batch(options['batch_size'], backends, options['lease_seconds'])
+                totals = [total + n for total, n in zip(totals, counts)]
+                if time.monotonic() - last_report >= options['report_every']:
+                    self.report(totals, time.monotonic() - started)
+                    last_report = time.monotonic()
+                if not any(counts):
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.report(totals, time.monotonic() - started)
+
+    def report(self, totals, elapsed):
+        sent, retried, failed = totals
+        queue = outbox.stats()
+        self.stdout.write(
+            f'{sent} sent, {retried} retried, {failed} failed; '
+            f'{sent / elapsed if elapsed else 0:,.0f} msg/s; '
+            f"{queue['pending']} pending, lag {queue['lag'].total_seconds():.1f}s"
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from booking.scheduling import generate_timeslots
+
+
+class Command(BaseCommand):
+    help = 'Create TimeSlots from the weekly schedule templates for a date range (inclusive).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help='First date, YYYY-MM-DD')
+        parser.add_argument('end', help='Last date, YYYY-MM-DD')
+        parser.add_argument('--employee', type=int, action='append', dest='employees',
+                            help='Only this employee id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start, end = parse_date(options['start']), parse_date(options['end'])
+        if not start or not end or start > end:
+            raise CommandError('Give a valid start and end date, start first.')
+        report = generate_timeslots(start, end, options['employees'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(str(report)))
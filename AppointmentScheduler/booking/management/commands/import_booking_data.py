@@ -0,0 +1,48 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import transfer
+
+
+class Command(BaseCommand):
+    help = ('Import users, employees, services, timeslots or appointments from CSV or JSON Lines, '
+            'matching rows by natural key: existing rows are updated, new ones created. '
+            'Import datasets in that order so the rows they refer to exist.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(transfer.DATASETS))
+        parser.add_argument('path', help="File to read, or '-' for stdin.")
+        parser.add_argument('--format', choices=transfer.FORMATS,
+                            help='Defaults to the file extension, or csv for stdin.')
+        parser.add_argument('--batch-size', type=int, default=transfer.BATCH_SIZE)
+        parser.add_argument('--errors', help='Write every rejected row, with its line and error, to this CSV file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        errors = open(options['errors'], 'w', newline='', encoding='utf-8') if options['errors'] else None
+        try:
+            report = transfer.import_rows(options['dataset'], stream, fmt, options['batch_size'],
+                                          errors_file=errors, progress=self.progress)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if errors:
+                errors.close()
+
+        for line, message in report.errors:
+            self.stderr.write(f'line {line}: {message}')
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... and {report.failed - len(report.errors):,} more')
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{report.read:,} rows read: {report.created:,} created, {report.updated:,} updated, '
+            f'{report.unchanged:,} unchanged, {report.failed:,} rejected ({report.rate:,.0f} rows/s).'))
+
+    def progress(self, report):
+        self.stderr.write(f'{report.read:,} rows, {report.rate:,.0f} rows/s')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking import live
+
+
+class Command(BaseCommand):
+    help = 'Delete live availability log entries older than --days; reconnecting clients past them get a reset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        removed = live.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed:,} slot changes older than {options["days"]} days.'))
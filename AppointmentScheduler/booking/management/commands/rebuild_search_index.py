@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking import search
+
+
+class Command(BaseCommand):
+    help = 'Re-create the full-text search documents, e.g. after bulk imports that bypassed signals.'
+
+    def handle(self, *args, **options):
+        if not search.tokenizer():
+            self.stdout.write(self.style.WARNING('No search index on this database; list views use LIKE filters.'))
+            return
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index ({search.tokenizer()} tokenizer).'))
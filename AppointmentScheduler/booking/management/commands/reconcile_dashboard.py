@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from booking.dashboard import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the HomeView dashboard totals from scratch, report drift and fix it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it.')
+
+    def handle(self, *args, **options):
+        drift = reconcile(fix=not options['dry_run'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Dashboard totals are in sync.'))
+            return
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'{name}: stored {stored}, actual {actual}')
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.WARNING(f'{verb} drift in {len(drift)} total(s).'))
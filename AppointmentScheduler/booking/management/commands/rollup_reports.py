@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from booking import reports
+
+
+class Command(BaseCommand):
+    help = ('Roll up every closed day the report watermark has not reached yet, and re-aggregate rolled-up '
+            'days edited since. Run it nightly after midnight, and more often if late edits must show sooner; '
+            'the revenue time series only serves rolled-up days.')
+
+    def handle(self, *args, **options):
+        filled_through = reports.fill_closed_days()
+        refreshed = reports.refresh_dirty_days()
+        self.stdout.write(self.style.SUCCESS(
+            f'Daily rollups filled through {filled_through}; re-aggregated {refreshed} edited day(s).'))
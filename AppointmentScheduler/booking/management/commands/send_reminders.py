@@ -0,0 +1,29 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking import reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue REMINDER notifications for upcoming appointments; run every minute (e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead', type=int, action='append', dest='leads', metavar='MINUTES',
+                            help='Lead time in minutes; repeat for several. '
+                                 'Defaults to BOOKING_REMINDER_LEAD_MINUTES (24h and 1h).')
+        parser.add_argument('--lookback', type=int, default=int(reminders.LOOKBACK.total_seconds() // 60),
+                            help='Minutes each window reaches back, to catch up after missed runs.')
+        parser.add_argument('--chunk-size', type=int, default=reminders.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        queued = reminders.send_due_reminders(
+            leads=options['leads'],
+            lookback=datetime.timedelta(minutes=options['lookback']),
+            chunk_size=options['chunk_size'],
+        )
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count} at {minutes} min' for minutes, count in queued.items())
+        self.stdout.write(f'Queued reminders: {summary} ({elapsed:.2f}s)')
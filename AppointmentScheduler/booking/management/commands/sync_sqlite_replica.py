@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_database(source, target_name):
+    """Copy the SQLite database behind connection ``source`` into the file ``target_name``."""
+    source.ensure_connection()
+    target = sqlite3.connect(target_name)
+    try:
+        # The backup API copies a consistent snapshot, even while the primary is being written.
+        source.connection.backup(target)
+    finally:
+        target.close()
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into each SQLite read replica in DATABASE_REPLICA_URLS, '
+            'standing in for replication when trying the replica router locally.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep copying every INTERVAL seconds, simulating replication lag.')
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if connections[alias].vendor == 'sqlite']
+        if source.vendor != 'sqlite' or not replicas:
+            raise CommandError('Needs a SQLite primary and at least one SQLite URL in DATABASE_REPLICA_URLS.')
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                copy_database(source, connections[alias].settings_dict['NAME'])
+            self.stdout.write(f'Copied {source.settings_dict["NAME"]} to {len(replicas)} replica(s) '
+                              f'in {(time.perf_counter() - started) * 1000:.0f}ms.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
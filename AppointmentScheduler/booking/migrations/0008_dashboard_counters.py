@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:35
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def seed_counters(apps, schema_editor):
+    Appointment = apps.get_model('booking', 'Appointment')
+    Employee = apps.get_model('booking', 'Employee')
+    DashboardCounter = apps.get_model('booking', 'DashboardCounter')
+    AppointmentDayCount = apps.get_model('booking', 'AppointmentDayCount')
+
+    revenue = Appointment.objects.filter(status='active').aggregate(total=Sum('services__price'))['total']
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(name='appointments_total', value=Appointment.objects.count()),
+        DashboardCounter(name='active_revenue', value=revenue or 0),
+        DashboardCounter(name='active_employees', value=Employee.objects.filter(is_active=True).count()),
+    ])
+    days = (Appointment.objects.annotate(day=TruncDate('appointment_date'))
+            .values('day').annotate(n=Count('id')).values_list('day', 'n'))
+    AppointmentDayCount.objects.bulk_create(AppointmentDayCount(date=day, count=n) for day, n in days)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import OperationalError, migrations
+
+# Kept in step with booking.search.TABLE; migrations must not import live app code.
+TABLE = 'booking_search'
+# booking.search.DOCUMENTS as of this migration: rowid, title and body per source row.
+DOCUMENTS = (
+    "SELECT s.id * 4 + 1, s.service, '' FROM booking_service s",
+    'SELECT e.id * 4 + 2, e.name, e.specialization FROM booking_employee e',
+    "SELECT a.id * 4 + 3, COALESCE(s.service, '') || ' ' || COALESCE(e.name, ''), a.notes "
+    'FROM booking_appointment a '
+    'LEFT JOIN booking_service s ON s.id = a.services_id '
+    'LEFT JOIN booking_employee e ON e.id = a.employee_id',
+)
+
+
+def create_search_index(apps, schema_editor):
+    using = schema_editor.connection
+    using.__dict__.pop('booking_search_tokenizer', None)
+    if using.vendor != 'sqlite':
+        return
+    for tokenizer in ('trigram', 'unicode61'):
+        try:
+            with using.cursor() as cursor:
+                cursor.execute(f"CREATE VIRTUAL TABLE {TABLE} USING fts5(title, body, tokenize='{tokenizer}')")
+        except OperationalError:
+            continue
+        with using.cursor() as cursor:
+            for select in DOCUMENTS:
+                cursor.execute(f'INSERT INTO {TABLE} (rowid, title, body) {select}')
+        return
+
+
+def drop_search_index(apps, schema_editor):
+    using = schema_editor.connection
+    if using.vendor == 'sqlite':
+        with using.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        using.__dict__.pop('booking_search_tokenizer', None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_timeslot_list_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
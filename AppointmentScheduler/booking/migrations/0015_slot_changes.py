@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_appointment_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('slot.added', 'Slot added'), ('slot.removed', 'Slot removed'), ('slot.booked', 'Slot booked'), ('slot.released', 'Slot released'), ('appointment.saved', 'Appointment saved'), ('appointment.cancelled', 'Appointment cancelled')], max_length=25)),
+                ('employee_id', models.IntegerField()),
+                ('date', models.DateField()),
+                ('timeslot_id', models.IntegerField(blank=True, null=True)),
+                ('appointment_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_calendar_feeds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField()),
+                ('username', models.CharField(max_length=150)),
+                ('employee_id', models.BigIntegerField(blank=True, null=True)),
+                ('employee_name', models.CharField(blank=True, max_length=100)),
+                ('service_id', models.BigIntegerField(blank=True, null=True)),
+                ('service_name', models.CharField(blank=True, max_length=100)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('appointment_date', models.DateTimeField()),
+                ('timeslot_date', models.DateField(blank=True, null=True)),
+                ('timeslot_start', models.TimeField(blank=True, null=True)),
+                ('timeslot_end', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive')], max_length=20)),
+                ('notes', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['appointment_date', 'id'], name='archived_appt_date_idx'), models.Index(fields=['user_id', 'appointment_date'], name='archived_appt_user_date_idx'), models.Index(fields=['employee_id', 'appointment_date'], name='archived_appt_emp_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('recipient_id', models.BigIntegerField()),
+                ('notification_type', models.CharField(choices=[('BOOKING_CONFIRMIATION', 'Booking Confirmation'), ('REMINDER', 'Reminder'), ('CANCELLATION', 'Cancellation'), ('RESCHEDULE', 'Reschedule')], max_length=50)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient_id', 'created_at'], name='archived_notif_recipient_idx')],
+            },
+        ),
+    ]
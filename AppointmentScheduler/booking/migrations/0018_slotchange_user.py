@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0017_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotchange',
+            name='user_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
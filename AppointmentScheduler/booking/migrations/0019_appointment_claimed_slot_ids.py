@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0018_slotchange_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='claimed_slot_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0019_appointment_claimed_slot_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcounter',
+            name='as_of',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
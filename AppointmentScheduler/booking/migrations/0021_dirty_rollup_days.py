@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0020_dashboardcounter_as_of'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+            ],
+        ),
+    ]
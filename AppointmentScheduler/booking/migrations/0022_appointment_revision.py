@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:12
+
+from django.db import migrations, models
+
+
+def stamp_existing(apps, schema_editor):
+    # Unknown for rows from before the field; their creation time is the best guess.
+    Appointment = apps.get_model('booking', 'Appointment')
+    Appointment.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0021_dirty_rollup_days'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(stamp_existing, migrations.RunPython.noop),
+    ]
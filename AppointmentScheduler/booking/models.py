@@ -1,6 +1,9 @@
+import secrets
+
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 # Create your models here.
 
@@ -36,10 +39,50 @@ class TimeSlot(models.Model):
 
     class Meta:
         unique_together = ('employee', 'date', 'start_time', 'end_time')
+        indexes = [
+            # load_timeslots: one employee's free slots on a day, in order
+            models.Index(fields=['employee', 'date', 'is_booked', 'start_time'], name='timeslot_emp_day_free_idx'),
+            # TimeSlotListView keyset ordering (date, start_time, id)
+            models.Index(fields=['date', 'start_time'], name='timeslot_date_start_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.name} - {self.date} {self.start_time}-{self.end_time}"
 
+class ScheduleTemplate(models.Model):
+    WEEKDAY_CHOICES = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='schedule_templates')
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveIntegerField(default=30, help_text="Length of each generated slot in minutes")
+    valid_from = models.DateField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.employee.name} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+class ScheduleException(models.Model):
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='schedule_exceptions',
+                                 null=True, blank=True, help_text="Leave empty for a holiday that applies to everyone")
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        who = self.employee.name if self.employee else "Everyone"
+        return f"{who} off {self.start_date}-{self.end_date}"
+
 class Appointment(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -56,6 +99,23 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     notes = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the booking last changed and how many times (booking.signals): calendar feeds' LAST-MODIFIED and SEQUENCE
+    updated_at = models.DateTimeField(auto_now=True)
+    sequence = models.PositiveIntegerField(default=0, editable=False)
+    # Every TimeSlot the booking claimed (see claims.py), released as-is even if the service's duration changes later
+    claimed_slot_ids = models.JSONField(default=list, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Calendar windows and HomeView's upcoming count
+            models.Index(fields=['appointment_date'], name='appointment_date_idx'),
+            # A customer's own calendar feed and list
+            models.Index(fields=['user', 'appointment_date'], name='appointment_user_date_idx'),
+            # Availability and employee schedules
+            models.Index(fields=['employee', 'appointment_date'], name='appointment_emp_date_idx'),
+            # Revenue over active appointments, and the reminder scheduler's due windows
+            models.Index(fields=['status', 'appointment_date'], name='appointment_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.services.service} for {self.user.username} on {self.appointment_date.strftime('%Y-%m-%d %H:%M')}"
@@ -79,6 +139,207 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # A recipient's unread notifications, newest first
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_inbox_idx'),
+            # A recipient's whole inbox, newest first
+            models.Index(fields=['recipient', 'created_at'], name='notification_recipient_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.notification_type}"
     
+
+
+# Running totals for HomeView, kept current by booking.dashboard
+class DashboardCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # For counters over a moving window (the upcoming count): the first day they cover
+    as_of = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+# Appointments per day, so the upcoming counter can roll past the days that end
+class AppointmentDayCount(models.Model):
+    date = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.count}"
+
+# One row per day, employee and service, filled by booking.reports
+class DailyRollup(models.Model):
+    date = models.DateField()
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    appointments = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    booked_slots = models.IntegerField(default=0)
+    total_slots = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='daily_rollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} employee={self.employee_id} service={self.service_id}"
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    filled_through = models.DateField()
+
+    def __str__(self):
+        return f"{self.name} through {self.filled_through}"
+
+# A rolled-up day edited since; rollup_reports re-aggregates it in its next batch
+class DirtyRollupDay(models.Model):
+    date = models.DateField(unique=True)
+
+    def __str__(self):
+        return f"{self.date} (stale rollup)"
+
+# Notification deliveries queued in the booking transaction, drained by deliver_notifications
+class OutboxMessage(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    notification_type = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    # Not a foreign key: cancellations outlive the appointment they describe.
+    appointment_id = models.IntegerField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    lease_token = models.CharField(max_length=32, blank=True)
+    notification = models.ForeignKey(Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: due pending messages, oldest first
+            models.Index(fields=['status', 'available_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} for user {self.recipient_id} ({self.status})"
+
+# One row per reminder sent, so reruns and overlapping schedulers never send twice
+class AppointmentReminder(models.Model):
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='+')
+    lead_minutes = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('appointment', 'lead_minutes')
+
+    def __str__(self):
+        return f"{self.lead_minutes} min reminder for appointment {self.appointment_id}"
+
+# Change log behind the live availability stream; its id is the SSE event id
+class SlotChange(models.Model):
+    KIND_CHOICES = (
+        ('slot.added', 'Slot added'),
+        ('slot.removed', 'Slot removed'),
+        ('slot.booked', 'Slot booked'),
+        ('slot.released', 'Slot released'),
+        ('appointment.saved', 'Appointment saved'),
+        ('appointment.cancelled', 'Appointment cancelled'),
+    )
+
+    kind = models.CharField(max_length=25, choices=KIND_CHOICES)
+    # Plain ids: the log outlives the rows it describes.
+    employee_id = models.IntegerField()
+    date = models.DateField()
+    timeslot_id = models.IntegerField(null=True, blank=True)
+    appointment_id = models.IntegerField(null=True, blank=True)
+    # The appointment's customer, so a stream can be limited to the viewer's own appointments.
+    user_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} for employee {self.employee_id} on {self.date}"
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(32)
+
+# Secret URL of one customer's or one employee's iCalendar subscription; calendar apps can't log in
+class CalendarFeed(models.Model):
+    token = models.CharField(max_length=64, unique=True, default=new_feed_token)
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='calendar_feed')
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='calendar_feed')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(user__isnull=False, employee__isnull=True)
+                | models.Q(user__isnull=True, employee__isnull=False),
+                name='calendar_feed_one_owner',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Calendar feed for {'user ' + str(self.user_id) if self.user_id else 'employee ' + str(self.employee_id)}"
+
+# Past appointments moved out of Appointment by archive_booking_data (see archive.py). Plain ids and
+# copied names, so the archive reads without joins and outlives the rows it refers to.
+class ArchivedAppointment(models.Model):
+    # The Appointment's own id, kept so links and logs still resolve.
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField()
+    username = models.CharField(max_length=150)
+    employee_id = models.BigIntegerField(null=True, blank=True)
+    employee_name = models.CharField(max_length=100, blank=True)
+    service_id = models.BigIntegerField(null=True, blank=True)
+    service_name = models.CharField(max_length=100, blank=True)
+    # The service's price when archived; archived revenue no longer follows price changes.
+    price = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    appointment_date = models.DateTimeField()
+    timeslot_date = models.DateField(null=True, blank=True)
+    timeslot_start = models.TimeField(null=True, blank=True)
+    timeslot_end = models.TimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    notes = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['appointment_date', 'id'], name='archived_appt_date_idx'),
+            models.Index(fields=['user_id', 'appointment_date'], name='archived_appt_user_date_idx'),
+            models.Index(fields=['employee_id', 'appointment_date'], name='archived_appt_emp_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_name} for {self.username} on {self.appointment_date.strftime('%Y-%m-%d %H:%M')}"
+
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    recipient_id = models.BigIntegerField()
+    notification_type = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient_id', 'created_at'], name='archived_notif_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived notification {self.id} for user {self.recipient_id}: {self.notification_type}"
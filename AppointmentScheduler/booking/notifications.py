@@ -0,0 +1,53 @@
+"""Per-recipient notification inbox.
+
+Each recipient has an inbox version in booking.cache, bumped by
+booking.signals on every saved or deleted notification and by the bulk
+paths here, which bypass signals. The unread count is cached under that
+version, so polling it costs a cache read until something changes.
+"""
+from itertools import islice
+
+from django.core.cache import cache
+
+from . import cache as booking_cache
+from .models import Notification
+
+BROADCAST_BATCH_SIZE = 1000
+
+
+def inbox_version(user_id):
+    return booking_cache.get_versions(booking_cache.inbox_key(user_id))[0]
+
+
+def unread_count(user_id):
+    key = f'booking:unread:{user_id}:{inbox_version(user_id)}'
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(key, count, booking_cache.PAYLOAD_TIMEOUT)
+    return count
+
+
+def mark_all_read(user_id):
+    """Mark every unread notification of one recipient as read in a single UPDATE."""
+    updated = Notification.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True)
+    if updated:
+        booking_cache.bump(booking_cache.inbox_key(user_id))
+    return updated
+
+
+def broadcast(recipient_ids, notification_type, message, batch_size=BROADCAST_BATCH_SIZE):
+    """Send one message to every id in ``recipient_ids``, ``batch_size`` rows per INSERT; return the count."""
+    recipient_ids = iter(recipient_ids)
+    sent = 0
+    while True:
+        batch = list(islice(recipient_ids, batch_size))
+        if not batch:
+            return sent
+        Notification.objects.bulk_create(
+            [Notification(recipient_id=user_id, notification_type=notification_type, message=message)
+             for user_id in batch],
+            batch_size=batch_size,
+        )
+        booking_cache.bump(*(booking_cache.inbox_key(user_id) for user_id in batch))
+        sent += len(batch)
@@ -0,0 +1,208 @@
+"""Transactional outbox for booking notifications.
+
+Booking paths call ``enqueue`` inside the transaction that changes the
+Appointment, so a message exists exactly when the change commits and the
+request pays for one INSERT. The ``deliver_notifications`` worker claims due
+messages in batches under a lease, creates the in-app Notification, hands
+the text to each configured delivery backend and retries failures with
+exponential backoff.
+
+Claims are a conditional UPDATE on the lease columns, which is safe on
+SQLite; where the database supports it the candidate rows are also locked
+with SKIP LOCKED so concurrent workers don't contend for the same batch.
+The in-app Notification is created at most once per message; external
+backends are at-least-once, since a retry re-sends through all of them.
+"""
+import datetime
+import logging
+import random
+import uuid
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import cache as booking_cache
+from .models import Employee, Notification, OutboxMessage, Service
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 60 * 60
+
+MESSAGES = {
+    'BOOKING_CONFIRMIATION': "Your {service} appointment with {employee} on {when} is confirmed.",
+    'RESCHEDULE': "Your {service} appointment with {employee} has been moved to {when}.",
+    'CANCELLATION': "Your {service} appointment with {employee} on {when} has been cancelled.",
+    'REMINDER': "Reminder: {service} with {employee} on {when}.",
+}
+
+
+def _message(appointment, notification_type):
+    return OutboxMessage(
+        notification_type=notification_type,
+        recipient_id=appointment.user_id,
+        appointment_id=appointment.pk,
+        # Ids only: names are looked up by the worker, off the request path.
+        payload={
+            'service_id': appointment.services_id,
+            'employee_id': appointment.employee_id,
+            'when': appointment.appointment_date.isoformat(),
+        },
+    )
+
+
+def enqueue(appointment, notification_type):
+    """Queue a notification about ``appointment``; call inside the transaction that changed it."""
+    message = _message(appointment, notification_type)
+    message.save()
+    return message
+
+
+def enqueue_many(appointments, notification_type, batch_size=1000):
+    return OutboxMessage.objects.bulk_create(
+        [_message(appointment, notification_type) for appointment in appointments], batch_size=batch_size)
+
+
+def render(message, services=None, employees=None):
+    payload = message.payload
+    services = services if services is not None else {}
+    employees = employees if employees is not None else {}
+    when = datetime.datetime.fromisoformat(payload['when'])
+    if timezone.is_aware(when):
+        when = timezone.localtime(when)
+    return MESSAGES[message.notification_type].format(
+        service=services.get(payload.get('service_id'), 'booking'),
+        employee=employees.get(payload.get('employee_id'), 'our team'),
+        when=when.strftime('%Y-%m-%d %H:%M'),
+    )
+
+
+class EmailBackend:
+    """Sends through Django's EMAIL_BACKEND to the recipient's address, if they have one."""
+
+    def send(self, message, text, recipient):
+        if recipient.email:
+            send_mail(message.get_notification_type_display(), text, None, [recipient.email])
+
+
+class SMSBackend:
+    """Stub for an SMS gateway: logs what would be sent."""
+
+    def send(self, message, text, recipient):
+        logger.info('SMS to user %s: %s', recipient.pk, text)
+
+
+def get_backends():
+    return [import_string(path)() for path in getattr(settings, 'BOOKING_DELIVERY_BACKENDS', [])]
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claimable(now):
+    return Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+
+
+def claim_batch(size, lease_seconds=LEASE_SECONDS, now=None):
+    """Lease up to ``size`` due messages; return them with their recipients loaded."""
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due = (OutboxMessage.objects.filter(status='pending', available_at__lte=now)
+               .filter(_claimable(now)).order_by('available_at', 'id'))
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:size])
+        if not ids:
+            return []
+        # Re-checking the lease makes the claim exclusive even without row locks.
+        OutboxMessage.objects.filter(id__in=ids).filter(_claimable(now)).update(
+            leased_until=now + datetime.timedelta(seconds=lease_seconds), lease_token=token)
+    return list(OutboxMessage.objects.filter(lease_token=token).select_related('recipient').order_by('id'))
+
+
+def _create_notifications(messages, texts):
+    """Create the in-app Notification for every message that doesn't have one yet."""
+    missing = [message for message in messages if message.notification_id is None]
+    if not missing:
+        return
+    with transaction.atomic():
+        created = Notification.objects.bulk_create([
+            Notification(recipient_id=message.recipient_id, notification_type=message.notification_type,
+                         message=texts[message.pk])
+            for message in missing
+        ])
+        for message, notification in zip(missing, created):
+            message.notification = notification
+        OutboxMessage.objects.bulk_update(missing, ['notification'])
+    # bulk_create skips the signal that invalidates cached unread counts.
+    booking_cache.bump(*{booking_cache.inbox_key(message.recipient_id) for message in missing})
+
+
+def _failed(message, exc):
+    attempts = message.attempts + 1
+    logger.warning('Delivery of outbox message %s failed (attempt %s): %s', message.pk, attempts, exc)
+    held = OutboxMessage.objects.filter(pk=message.pk, lease_token=message.lease_token)
+    if attempts >= MAX_ATTEMPTS:
+        held.update(status='failed', attempts=attempts, leased_until=None, last_error=str(exc))
+        return True
+    held.update(attempts=attempts, leased_until=None, last_error=str(exc),
+                available_at=timezone.now() + backoff(attempts))
+    return False
+
+
+def process_batch(size=100, backends=None, lease_seconds=LEASE_SECONDS):
+    """Claim and deliver one batch; return ``(sent, retried, failed)``."""
+    backends = get_backends() if backends is None else backends
+    messages = claim_batch(size, lease_seconds)
+    if not messages:
+        return 0, 0, 0
+    services = dict(Service.objects.filter(pk__in={m.payload.get('service_id') for m in messages})
+                    .values_list('id', 'service'))
+    employees = dict(Employee.objects.filter(pk__in={m.payload.get('employee_id') for m in messages})
+                     .values_list('id', 'name'))
+    texts = {message.pk: render(message, services, employees) for message in messages}
+
+    delivered, retried, failed = [], 0, 0
+    try:
+        _create_notifications(messages, texts)
+    except Exception as exc:
+        for message in messages:
+            if _failed(message, exc):
+                failed += 1
+            else:
+                retried += 1
+        return 0, retried, failed
+    for message in messages:
+        try:
+            for backend in backends:
+                backend.send(message, texts[message.pk], message.recipient)
+        except Exception as exc:
+            if _failed(message, exc):
+                failed += 1
+            else:
+                retried += 1
+        else:
+            delivered.append(message.pk)
+    OutboxMessage.objects.filter(pk__in=delivered, lease_token=messages[0].lease_token).update(
+        status='sent', sent_at=timezone.now(), leased_until=None)
+    return len(delivered), retried, failed
+
+
+def stats(now=None):
+    """Pending message count and the age of the oldest due one (the queue lag)."""
+    now = now or timezone.now()
+    pending = OutboxMessage.objects.filter(status='pending')
+    oldest = pending.filter(available_at__lte=now).aggregate(oldest=Min('available_at'))['oldest']
+    return {
+        'pending': pending.count(),
+        'lag': (now - oldest) if oldest else datetime.timedelta(0),
+    }
@@ -0,0 +1,169 @@
+"""Keyset (cursor) pagination for ListViews.
+
+Pages are addressed by the ordering key of the last (``after``) or first
+(``before``) row shown, so every page is an indexed range scan that reads
+``page size + 1`` rows. There is no OFFSET and no COUNT(*). A view may
+instead hand over a list, such as the catalog (catalog.py); it is sorted by
+``keyset_ordering`` in Python, with the same comparison the cursors use,
+since the database's collation need not agree with Python's, and the
+cursors then pick its slice.
+"""
+import base64
+import json
+from functools import cmp_to_key
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _cursor_value(value):
+    # Full isoformat: DjangoJSONEncoder would round datetimes to milliseconds.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError(cursor)
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """Rows strictly after ``values`` in ``ordering`` (or strictly before if ``reverse``)."""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        name = ordering[i].lstrip('-')
+        descending = ordering[i].startswith('-') != reverse
+        step = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{name: values[i]}) & condition
+        condition = step
+    # Repeat the leading column as a plain range so the planner can seek on it.
+    leading = ordering[0].lstrip('-')
+    descending = ordering[0].startswith('-') != reverse
+    return Q(**{f'{leading}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+
+def keyset_compare(ordering, row_values, values):
+    """-1, 0 or 1 as ``row_values`` comes before, level with or after ``values`` under ``ordering``."""
+    for name, mine, theirs in zip(ordering, row_values, values):
+        if mine != theirs:
+            order = -1 if mine < theirs else 1
+            return -order if name.startswith('-') else order
+    return 0
+
+
+def keyset_follows(ordering, row_values, values, reverse=False):
+    """Whether a row whose ordering columns hold ``row_values`` matches ``keyset_filter(ordering, values, reverse)``."""
+    order = keyset_compare(ordering, row_values, values)
+    return order < 0 if reverse else order > 0
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_query(self):
+        return urlencode({**self._params, 'after': self.next_cursor})
+
+    @property
+    def previous_query(self):
+        return urlencode({**self._params, 'before': self.previous_cursor})
+
+
+class KeysetPaginationMixin:
+    """ListView mixin: set ``keyset_ordering`` to a unique ordering ending in the primary key."""
+    keyset_ordering = ('id',)
+    paginate_by = 50
+    max_paginate_by = 200
+
+    def get_paginate_by(self, queryset):
+        try:
+            size = int(self.request.GET.get('size', self.paginate_by))
+        except ValueError:
+            size = self.paginate_by
+        return max(1, min(size, self.max_paginate_by))
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = list(self.keyset_ordering)
+        fields = [self.model._meta.get_field(name.lstrip('-')) for name in ordering]
+        after, before = self.request.GET.get('after'), self.request.GET.get('before')
+        try:
+            cursor = decode_cursor(before or after, fields) if (before or after) else None
+        except InvalidCursor:
+            cursor, after, before = None, None, None
+
+        def values(obj):
+            return [getattr(obj, field.attname) for field in fields]
+
+        backwards = bool(before)
+        if isinstance(queryset, list):
+            rows = sorted(queryset, reverse=backwards, key=cmp_to_key(
+                lambda a, b: keyset_compare(self.keyset_ordering, values(a), values(b))))
+            if cursor is not None:
+                rows = [obj for obj in rows if keyset_follows(self.keyset_ordering, values(obj), cursor, backwards)]
+            rows = rows[:page_size + 1]
+        else:
+            if backwards:
+                ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+            queryset = queryset.order_by(*ordering)
+            if cursor is not None:
+                queryset = queryset.filter(keyset_filter(self.keyset_ordering, cursor, reverse=backwards))
+            rows = list(queryset[:page_size + 1])
+        page = keyset_page(self.request, rows, page_size, after, before, values)
+        return None, page, page.object_list, page.has_other_pages()
+
+
+def keyset_page(request, rows, page_size, after, before, values):
+    """The page for ``rows``, up to ``page_size + 1`` fetched in cursor direction.
+
+    ``values(obj)`` gives the ordering columns a cursor encodes.
+    """
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+
+    def key(obj):
+        return encode_cursor(values(obj))
+
+    params = {k: v for k, v in request.GET.items() if k not in ('after', 'before')}
+    return KeysetPage(
+        rows,
+        has_next=bool(before) or (more and not before),
+        has_previous=bool(after) or (more and bool(before)),
+        next_cursor=key(rows[-1]) if rows else None,
+        previous_cursor=key(rows[0]) if rows else None,
+        params=params,
+    )
@@ -0,0 +1,85 @@
+"""Appointment reminders, queued through the outbox by the send_reminders command.
+
+Each run looks at a narrow window per lead time: active appointments whose
+start is between ``lead - lookback`` and ``lead`` from now and that have no
+AppointmentReminder marker yet, read in keyset chunks off the
+(status, appointment_date) index so memory stays bounded however many are
+due. For every chunk, the markers and the REMINDER outbox messages are
+written in one transaction; the markers' unique constraint means a rerun,
+or a second scheduler racing this one, never sends twice.
+"""
+import datetime
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import outbox
+from .models import Appointment, AppointmentReminder
+from .pagination import keyset_filter
+
+LEAD_MINUTES = (24 * 60, 60)
+# How far back each run reaches, so a late or skipped run still catches up.
+LOOKBACK = datetime.timedelta(minutes=15)
+CHUNK_SIZE = 2000
+ORDERING = ('appointment_date', 'id')
+
+
+def lead_minutes():
+    return tuple(getattr(settings, 'BOOKING_REMINDER_LEAD_MINUTES', LEAD_MINUTES))
+
+
+# Just what outbox.enqueue_many reads, without building model instances.
+DueAppointment = namedtuple('DueAppointment', 'pk user_id services_id employee_id appointment_date')
+
+
+def due(lead, now=None, lookback=LOOKBACK):
+    """Active appointments starting between ``lead - lookback`` and ``lead`` from now, not yet reminded."""
+    now = now or timezone.now()
+    start = max(now, now + lead - lookback)
+    minutes = int(lead.total_seconds() // 60)
+    reminded = AppointmentReminder.objects.filter(appointment=OuterRef('pk'), lead_minutes=minutes)
+    return (Appointment.objects.filter(status='active', appointment_date__gt=start,
+                                       appointment_date__lte=now + lead)
+            .exclude(Exists(reminded)))
+
+
+def _send_chunk(appointments, minutes):
+    ids = [appointment.pk for appointment in appointments]
+    for _ in range(2):
+        sent = set(AppointmentReminder.objects.filter(appointment_id__in=ids, lead_minutes=minutes)
+                   .values_list('appointment_id', flat=True))
+        todo = [appointment for appointment in appointments if appointment.pk not in sent]
+        if not todo:
+            return 0
+        try:
+            with transaction.atomic():
+                AppointmentReminder.objects.bulk_create(
+                    [AppointmentReminder(appointment_id=appointment.pk, lead_minutes=minutes) for appointment in todo])
+                outbox.enqueue_many(todo, 'REMINDER')
+        except IntegrityError:
+            # Another scheduler claimed some of these first; recheck and send the rest.
+            continue
+        return len(todo)
+    return 0
+
+
+def send_due_reminders(now=None, leads=None, lookback=LOOKBACK, chunk_size=CHUNK_SIZE):
+    """Queue every due, not yet sent reminder; return ``{lead_minutes: queued}``."""
+    now = now or timezone.now()
+    queued = {}
+    for minutes in leads or lead_minutes():
+        queryset = due(datetime.timedelta(minutes=minutes), now, lookback).order_by(*ORDERING)
+        total, cursor = 0, None
+        while True:
+            chunk = queryset if cursor is None else queryset.filter(keyset_filter(ORDERING, cursor))
+            chunk = [DueAppointment(*row) for row in chunk.values_list(
+                'id', 'user_id', 'services_id', 'employee_id', 'appointment_date')[:chunk_size]]
+            if not chunk:
+                break
+            total += _send_chunk(chunk, minutes)
+            cursor = [chunk[-1].appointment_date, chunk[-1].pk]
+        queued[minutes] = total
+    return queued
@@ -0,0 +1,192 @@
+"""Revenue and utilization time series served from the DailyRollup table.
+
+Closed days (before today) are aggregated once with GROUP BY queries and
+stored per day, employee and service by the rollup_reports command; the
+watermark records how far that has got. A later edit to a closed day only
+marks it dirty (DirtyRollupDay), and the command's next run re-aggregates
+the dirty days in one batch. Requests only read what is stored,
+so closed days the command has not reached yet are missing from the series
+rather than aggregated while the user waits. Today is always computed live
+and never stored. Week and month buckets are summed from the daily rows in
+Python.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (Appointment, ArchivedAppointment, DailyRollup, DirtyRollupDay, Employee, RollupWatermark, Service,
+                     TimeSlot)
+
+WATERMARK = 'daily_rollup'
+METRICS = ('appointments', 'revenue', 'booked_slots', 'total_slots')
+BUCKETS = ('day', 'week', 'month')
+GROUPS = ('total', 'employee', 'service')
+FILL_CHUNK_DAYS = 92
+
+
+def _empty():
+    return {'appointments': 0, 'revenue': Decimal('0'), 'booked_slots': 0, 'total_slots': 0}
+
+
+def compute_days(start, end):
+    """Aggregate ``start``..``end`` (inclusive) from the booking tables, keyed by (date, employee, service)."""
+    lo = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+    hi = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min))
+    rows = defaultdict(_empty)
+    appointments = (
+        Appointment.objects.filter(status='active', appointment_date__gte=lo, appointment_date__lt=hi)
+        .annotate(day=TruncDate('appointment_date'))
+        .values('day', 'employee_id', 'services_id')
+        .annotate(n=Count('id'), revenue=Sum('services__price'))
+    )
+    for row in appointments:
+        metrics = rows[row['day'], row['employee_id'], row['services_id']]
+        metrics['appointments'] += row['n']
+        metrics['revenue'] += row['revenue'] or 0
+    # Moved out by archive.py, at the price they were archived with.
+    archived = (
+        ArchivedAppointment.objects.filter(status='active', appointment_date__gte=lo, appointment_date__lt=hi)
+        .annotate(day=TruncDate('appointment_date'))
+        .values('day', 'employee_id', 'service_id')
+        .annotate(n=Count('id'), revenue=Sum('price'))
+    )
+    archived = list(archived)
+    # The archive keeps ids of employees and services since deleted; count those as unassigned.
+    employees = set(Employee.objects.filter(pk__in={row['employee_id'] for row in archived})
+                    .values_list('pk', flat=True))
+    services = set(Service.objects.filter(pk__in={row['service_id'] for row in archived})
+                   .values_list('pk', flat=True))
+    for row in archived:
+        metrics = rows[row['day'],
+                       row['employee_id'] if row['employee_id'] in employees else None,
+                       row['service_id'] if row['service_id'] in services else None]
+        metrics['appointments'] += row['n']
+        metrics['revenue'] += row['revenue'] or 0
+    # Slots have no service, so they land on the service-less row for their employee.
+    slots = (
+        TimeSlot.objects.filter(date__range=(start, end))
+        .values('date', 'employee_id')
+        .annotate(total=Count('id'), booked=Count('id', filter=Q(is_booked=True)))
+    )
+    for row in slots:
+        metrics = rows[row['date'], row['employee_id'], None]
+        metrics['total_slots'] += row['total']
+        metrics['booked_slots'] += row['booked']
+    return rows
+
+
+@transaction.atomic
+def refresh_days(start, end):
+    rows = compute_days(start, end)
+    DailyRollup.objects.filter(date__range=(start, end)).delete()
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(date=date, employee_id=employee_id, service_id=service_id, **metrics)
+         for (date, employee_id, service_id), metrics in rows.items()],
+        batch_size=1000,
+    )
+
+
+def fill_closed_days(today=None):
+    """Roll up every closed day the watermark has not reached yet; return the watermark date."""
+    yesterday = (today or timezone.localdate()) - datetime.timedelta(days=1)
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+        if watermark is None:
+            first = [
+                Appointment.objects.aggregate(first=Min('appointment_date'))['first'],
+                ArchivedAppointment.objects.aggregate(first=Min('appointment_date'))['first'],
+                TimeSlot.objects.aggregate(first=Min('date'))['first'],
+            ]
+            first = [timezone.localdate(d) if isinstance(d, datetime.datetime) else d for d in first if d]
+            start = min(first) if first else yesterday + datetime.timedelta(days=1)
+            watermark = RollupWatermark.objects.create(name=WATERMARK,
+                                                       filled_through=start - datetime.timedelta(days=1))
+        while watermark.filled_through < yesterday:
+            start = watermark.filled_through + datetime.timedelta(days=1)
+            end = min(start + datetime.timedelta(days=FILL_CHUNK_DAYS - 1), yesterday)
+            refresh_days(start, end)
+            watermark.filled_through = end
+            watermark.save(update_fields=['filled_through'])
+    return watermark.filled_through
+
+
+def mark_dirty(date):
+    """Note a late edit to a closed day, for ``refresh_dirty_days`` to re-aggregate."""
+    if not isinstance(date, datetime.date) or date >= timezone.localdate():
+        return
+    DirtyRollupDay.objects.bulk_create([DirtyRollupDay(date=date)], ignore_conflicts=True)
+
+
+@transaction.atomic
+def refresh_dirty_days():
+    """Re-aggregate the rolled-up days marked dirty; return how many there were."""
+    dirty = list(DirtyRollupDay.objects.select_for_update().order_by('date'))
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).values_list('filled_through', flat=True).first()
+    # Days past the watermark are aggregated fresh when the fill reaches them.
+    for day in dirty:
+        if watermark and day.date <= watermark:
+            refresh_days(day.date, day.date)
+    DirtyRollupDay.objects.filter(pk__in=[day.pk for day in dirty]).delete()
+    return len(dirty)
+
+
+def bucket_start(date, bucket):
+    if bucket == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if bucket == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def filled_through():
+    """The last closed day rolled up, or None before rollup_reports has first run."""
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list('filled_through', flat=True).first()
+
+
+def timeseries(start, end, bucket='day', group='total', today=None):
+    """Return ``(series, filled_through)``; closed days after ``filled_through`` are left out."""
+    today = today or timezone.localdate()
+    watermark = filled_through()
+
+    daily = []
+    stored_end = min(end, watermark) if watermark else None
+    if stored_end and start <= stored_end:
+        daily.extend(
+            DailyRollup.objects.filter(date__range=(start, stored_end))
+            .values_list('date', 'employee_id', 'service_id', *METRICS)
+            .iterator(chunk_size=2000)
+        )
+    if start <= today <= end:
+        daily.extend((date, employee_id, service_id, *(metrics[m] for m in METRICS))
+                     for (date, employee_id, service_id), metrics in compute_days(today, today).items())
+
+    series = defaultdict(lambda: defaultdict(_empty))
+    for date, employee_id, service_id, *values in daily:
+        key = {'total': None, 'employee': employee_id, 'service': service_id}[group]
+        point = series[key][bucket_start(date, bucket)]
+        for metric, value in zip(METRICS, values):
+            point[metric] += value
+
+    labels = {None: 'All' if group == 'total' else 'Unassigned'}
+    if group == 'employee':
+        labels.update(Employee.objects.filter(pk__in=[k for k in series if k]).values_list('id', 'name'))
+    elif group == 'service':
+        labels.update(Service.objects.filter(pk__in=[k for k in series if k]).values_list('id', 'service'))
+
+    result = []
+    for key in sorted(series, key=lambda k: (k is not None, k or 0)):
+        points = []
+        for period, metrics in sorted(series[key].items()):
+            total = metrics['total_slots']
+            points.append({
+                'period': period,
+                **metrics,
+                'utilization': round(metrics['booked_slots'] / total, 4) if total else None,
+            })
+        result.append({'key': key, 'label': labels.get(key, str(key)), 'points': points})
+    return result, watermark
@@ -0,0 +1,120 @@
+"""Materialize TimeSlot rows from weekly ScheduleTemplates.
+
+Slots are inserted with ``bulk_create(ignore_conflicts=True)`` so the
+``('employee', 'date', 'start_time', 'end_time')`` unique constraint makes
+re-running a range a no-op.
+"""
+import datetime
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import cache as booking_cache
+from . import live
+from .models import ScheduleException, ScheduleTemplate, TimeSlot
+
+
+@dataclass
+class GenerationReport:
+    generated: int
+    created: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.generated / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.created} new slots ({self.generated} generated) "
+                f"in {self.seconds:.2f}s, {self.rows_per_second:,.0f} rows/sec")
+
+
+def _split(date, template):
+    start = datetime.datetime.combine(date, template.start_time)
+    end = datetime.datetime.combine(date, template.end_time)
+    step = datetime.timedelta(minutes=template.slot_minutes)
+    while start + step <= end:
+        yield start.time(), (start + step).time()
+        start += step
+
+
+def iter_timeslots(start_date, end_date, employee_ids=None):
+    """Yield unsaved TimeSlots for every active template between the two dates (inclusive)."""
+    templates = ScheduleTemplate.objects.filter(
+        is_active=True, employee__is_active=True, slot_minutes__gt=0,
+    ).filter(
+        Q(valid_from__isnull=True) | Q(valid_from__lte=end_date),
+        Q(valid_until__isnull=True) | Q(valid_until__gte=start_date),
+    ).order_by('employee_id', 'weekday', 'start_time')
+    exceptions = ScheduleException.objects.filter(start_date__lte=end_date, end_date__gte=start_date)
+    if employee_ids:
+        templates = templates.filter(employee_id__in=employee_ids)
+        exceptions = exceptions.filter(Q(employee__isnull=True) | Q(employee_id__in=employee_ids))
+
+    by_weekday = defaultdict(list)
+    for template in templates:
+        by_weekday[template.weekday].append(template)
+    closed = defaultdict(list)
+    for exception in exceptions:
+        closed[exception.employee_id].append((exception.start_date, exception.end_date))
+
+    def is_closed(employee_id, date):
+        return any(lo <= date <= hi for lo, hi in closed[None] + closed[employee_id])
+
+    date = start_date
+    while date <= end_date:
+        for template in by_weekday[date.weekday()]:
+            if template.valid_from and date < template.valid_from:
+                continue
+            if template.valid_until and date > template.valid_until:
+                continue
+            if is_closed(template.employee_id, date):
+                continue
+            for slot_start, slot_end in _split(date, template):
+                yield TimeSlot(employee_id=template.employee_id, date=date,
+                               start_time=slot_start, end_time=slot_end)
+        date += datetime.timedelta(days=1)
+
+
+def _slot_counts(days):
+    """``{(employee_id, date): slots}`` for ``days``; days without slots are left out."""
+    rows = (TimeSlot.objects.filter(employee_id__in={employee_id for employee_id, _ in days},
+                                    date__in={date for _, date in days})
+            .values_list('employee_id', 'date').annotate(slots=Count('id')).order_by())
+    return {(employee_id, date): slots for employee_id, date, slots in rows if (employee_id, date) in days}
+
+
+def generate_timeslots(start_date, end_date, employee_ids=None, batch_size=1000):
+    """Insert slots for the range in chunks; safe to run repeatedly over the same range."""
+    started = time.perf_counter()
+    existing = TimeSlot.objects.filter(date__range=(start_date, end_date))
+    if employee_ids:
+        existing = existing.filter(employee_id__in=employee_ids)
+    before = existing.count()
+
+    generated = 0
+    slots = iter_timeslots(start_date, end_date, employee_ids)
+    while True:
+        chunk = list(islice(slots, batch_size))
+        if not chunk:
+            break
+        days = {(slot.employee_id, slot.date) for slot in chunk}
+        with transaction.atomic():
+            before_chunk = _slot_counts(days)
+            TimeSlot.objects.bulk_create(chunk, ignore_conflicts=True)
+            # Conflicting slots are skipped silently; only days that gained one changed.
+            after_chunk = _slot_counts(days)
+            changed = {day for day in days if after_chunk.get(day, 0) != before_chunk.get(day, 0)}
+            if changed:
+                live.record_days('slot.added', changed)
+        generated += len(chunk)
+        if changed:
+            # bulk_create sends no signals, so invalidate the cached days by hand.
+            booking_cache.bump(*{booking_cache.day_key(*day) for day in changed})
+
+    created = existing.count() - before
+    return GenerationReport(generated, created, time.perf_counter() - started)
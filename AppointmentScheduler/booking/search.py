@@ -0,0 +1,189 @@
+"""Full-text search for the list views' ``?q=`` parameter.
+
+On SQLite builds with FTS5 the ``booking_search`` virtual table (created and
+filled by migration 0011, rebuilt by the rebuild_search_index command) holds
+one document per service, employee and appointment, kept in sync by
+booking.signals. Its rowid encodes the source row as
+``id * 4 + kind``, so updates and joins are rowid lookups. The trigram
+tokenizer matches any substring of three or more characters, which covers
+prefixes; builds without it fall back to unicode61 with ``term*`` prefix
+queries. Anything else (another database, no FTS5, a query too short to
+index) uses the original ``icontains`` filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, IntegerField, Q
+
+from .models import Appointment, Employee, Service
+from .pagination import InvalidCursor, decode_cursor, keyset_page
+
+TABLE = 'booking_search'
+SERVICE, EMPLOYEE, APPOINTMENT = 1, 2, 3
+KINDS = {Service: SERVICE, Employee: EMPLOYEE, Appointment: APPOINTMENT}
+# bm25 column weights: a hit in the name outranks one in the notes.
+WEIGHTS = (10.0, 1.0)
+RANK = f'bm25({TABLE}, {WEIGHTS[0]}, {WEIGHTS[1]})'
+# What a ranked page's cursor holds: the row's rank and pk.
+CURSOR_FIELDS = (FloatField(), IntegerField())
+
+# The LIKE path each list view used before the index existed.
+FALLBACK_FIELDS = {
+    Service: ('service',),
+    Employee: ('name',),
+    Appointment: ('services__service', 'employee__name'),
+}
+
+# (source table, alias, SELECT rowid, title, body); reindexing appends a WHERE on the alias.
+DOCUMENTS = {
+    SERVICE: ('booking_service', 's', "SELECT s.id * 4 + 1, s.service, '' FROM booking_service s"),
+    EMPLOYEE: ('booking_employee', 'e', 'SELECT e.id * 4 + 2, e.name, e.specialization FROM booking_employee e'),
+    APPOINTMENT: (
+        'booking_appointment', 'a',
+        "SELECT a.id * 4 + 3, COALESCE(s.service, '') || ' ' || COALESCE(e.name, ''), a.notes "
+        'FROM booking_appointment a '
+        'LEFT JOIN booking_service s ON s.id = a.services_id '
+        'LEFT JOIN booking_employee e ON e.id = a.employee_id',
+    ),
+}
+
+
+def tokenizer(using=connection):
+    """The index's tokenizer, or None when there is no index on this database."""
+    if not hasattr(using, 'booking_search_tokenizer'):
+        found = None
+        if using.vendor == 'sqlite':
+            with using.cursor() as cursor:
+                cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [TABLE])
+                row = cursor.fetchone()
+            if row:
+                found = 'trigram' if 'trigram' in row[0] else 'unicode61'
+        using.booking_search_tokenizer = found
+    return using.booking_search_tokenizer
+
+
+def _reindex(kind, where=None, params=()):
+    table, alias, select = DOCUMENTS[kind]
+    clause = f' WHERE {alias}.{where}' if where else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN (SELECT {alias}.id * 4 + {kind} FROM {table} {alias}{clause})',
+            params,
+        )
+        cursor.execute(f'INSERT INTO {TABLE} (rowid, title, body) {select}{clause}', params)
+
+
+def index(instance):
+    if tokenizer():
+        _reindex(KINDS[type(instance)], 'id = %s', [instance.pk])
+
+
+def remove(instance):
+    if tokenizer():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [instance.pk * 4 + KINDS[type(instance)]])
+
+
+def remove_appointments(ids):
+    """Drop the documents of appointments deleted without signals (see archive.py)."""
+    if ids and tokenizer():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(ids))})',
+                           [pk * 4 + APPOINTMENT for pk in ids])
+
+
+def reindex_appointments(**lookup):
+    """Refresh appointment documents after a service or employee is renamed."""
+    if tokenizer():
+        (field, value), = lookup.items()
+        _reindex(APPOINTMENT, f'{field} = %s', [value])
+
+
+def rebuild():
+    """Re-create every document, e.g. after bulk_create() or raw SQL bypassed the signals."""
+    if tokenizer():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        for kind in DOCUMENTS:
+            _reindex(kind)
+
+
+def match_expression(query, using=connection):
+    """Translate user input into an FTS5 query, or None if the index cannot answer it."""
+    kind = tokenizer(using)
+    terms = [term.replace('"', '""') for term in query.split()]
+    if kind == 'trigram':
+        # Trigrams need three characters; shorter terms would match nothing.
+        terms = [term for term in terms if len(term) >= 3]
+        return ' '.join(f'"{term}"' for term in terms) or None
+    if kind == 'unicode61':
+        terms = [term for term in terms if re.search(r'\w', term)]
+        return ' '.join(f'"{term}"*' for term in terms) or None
+    return None
+
+
+def like_filter(queryset, query):
+    condition = Q()
+    for field in FALLBACK_FIELDS[queryset.model]:
+        condition |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(condition)
+
+
+def search(queryset, query):
+    """Filter ``queryset`` to rows matching ``query``; return ``(queryset, ranked)``.
+
+    Ranked results are ordered best first by bm25.
+    """
+    query = query.strip()
+    expression = match_expression(query)
+    if expression is None:
+        return like_filter(queryset, query), False
+    table = queryset.model._meta.db_table
+    kind = KINDS[queryset.model]
+    queryset = queryset.extra(
+        tables=[TABLE],
+        where=[f'{TABLE} MATCH %s', f'{table}.id = {TABLE}.rowid / 4', f'{TABLE}.rowid %% 4 = {kind}'],
+        params=[expression],
+        select={'search_rank': RANK},
+    )
+    return queryset.order_by('search_rank', 'pk'), True
+
+
+def ranked_after(queryset, rank, pk, reverse=False):
+    """Ranked results strictly after the row at ``(rank, pk)``, or strictly before it if ``reverse``."""
+    op = '<' if reverse else '>'
+    column = f'{queryset.model._meta.db_table}.id'
+    return queryset.extra(where=[f'({RANK} {op} %s OR ({RANK} = %s AND {column} {op} %s))'],
+                          params=[rank, rank, pk])
+
+
+class SearchMixin:
+    """ListView mixin: ``?q=`` goes through the search index, best matches first.
+
+    Use ``search_queryset()`` in ``get_queryset``. Ranked results are paged with
+    a keyset on (rank, pk) instead of the view's ``keyset_ordering``.
+    """
+    search_ranked = False
+
+    def search_queryset(self, queryset):
+        query = self.request.GET.get('q', '').strip()
+        if not query:
+            return queryset
+        queryset, self.search_ranked = search(queryset, query)
+        return queryset
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.search_ranked:
+            return super().paginate_queryset(queryset, page_size)
+        after, before = self.request.GET.get('after'), self.request.GET.get('before')
+        try:
+            cursor = decode_cursor(before or after, CURSOR_FIELDS) if (before or after) else None
+        except InvalidCursor:
+            cursor, after, before = None, None, None
+        if cursor is not None:
+            queryset = ranked_after(queryset, *cursor, reverse=bool(before))
+        if before:
+            queryset = queryset.order_by('-search_rank', '-pk')
+        rows = list(queryset[:page_size + 1])
+        page = keyset_page(self.request, rows, page_size, after, before, lambda obj: [obj.search_rank, obj.pk])
+        return None, page, page.object_list, page.has_other_pages()
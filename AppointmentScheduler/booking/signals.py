@@ -0,0 +1,315 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache as booking_cache
+from . import catalog
+from . import dashboard
+from . import live
+from . import reports
+from . import search
+from .models import Appointment, Employee, Notification, Service, TimeSlot
+
+
+def _slot_state(instance):
+    # Read straight from __dict__ so deferred fields are never loaded here.
+    data = instance.__dict__
+    return (data.get('employee_id'), data.get('date'), data.get('start_time'), data.get('end_time'))
+
+
+@receiver(post_init, sender=TimeSlot)
+def remember_timeslot_state(sender, instance, **kwargs):
+    instance._original_state = _slot_state(instance)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def bump_timeslot_versions(sender, instance, **kwargs):
+    keys = {booking_cache.day_key(instance.employee_id, instance.date)}
+    original = getattr(instance, '_original_state', None)
+    current = _slot_state(instance)
+    if original and original[0] is not None and original != current:
+        keys.add(booking_cache.day_key(original[0], original[1]))
+        # Moving a slot changes the times shown for any appointment on it.
+        keys.add(booking_cache.CATALOG_KEY)
+    booking_cache.bump(*keys)
+    instance._original_state = current
+
+
+def _appointment_day(instance):
+    data = instance.__dict__
+    employee_id, appointment_date = data.get('employee_id'), data.get('appointment_date')
+    if employee_id is None or appointment_date is None:
+        return None
+    if timezone.is_aware(appointment_date):
+        appointment_date = timezone.localtime(appointment_date)
+    return (employee_id, appointment_date.date())
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_day(sender, instance, **kwargs):
+    instance._original_day = _appointment_day(instance)
+    instance._original_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(pre_save, sender=Appointment)
+def count_appointment_revision(sender, instance, raw=False, **kwargs):
+    # A calendar feed's SEQUENCE: subscribed apps replace their copy when it goes up.
+    if not raw and not instance._state.adding:
+        instance.sequence += 1
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_appointment_versions(sender, instance, **kwargs):
+    keys = {booking_cache.user_key(instance.user_id), booking_cache.ALL_APPOINTMENTS_KEY}
+    # Moving an appointment to another customer changes the previous one's list too.
+    original_user_id = getattr(instance, '_original_user_id', None)
+    if original_user_id is not None:
+        keys.add(booking_cache.user_key(original_user_id))
+    # Appointments block availability for their employee's day (see availability.py).
+    for day in (getattr(instance, '_original_day', None), _appointment_day(instance)):
+        if day:
+            keys.add(booking_cache.day_key(*day))
+            keys.add(booking_cache.employee_key(day[0]))
+    booking_cache.bump(*keys)
+    instance._original_day = _appointment_day(instance)
+    instance._original_user_id = instance.user_id
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def bump_catalog_version(sender, instance, **kwargs):
+    # Service and employee names are part of every calendar event title, and
+    # the rows themselves are cached by catalog.py.
+    catalog.invalidate()
+    # Again once committed: a reader between the two bumps cached the old rows.
+    transaction.on_commit(catalog.invalidate)
+
+
+# HomeView totals (see dashboard.py). State captured at load time lets each
+# save apply only its delta; rows loaded with deferred fields carry no state
+# and are left to reconcile_dashboard.
+
+def _dashboard_state(instance):
+    data = instance.__dict__
+    if not {'status', 'services_id', 'appointment_date'} <= data.keys():
+        return None
+    appointment_date = data['appointment_date']
+    if appointment_date is not None and timezone.is_aware(appointment_date):
+        appointment_date = timezone.localtime(appointment_date)
+    return (data['status'], data['services_id'], appointment_date.date() if appointment_date else None)
+
+
+def _apply_dashboard_state(state, sign):
+    status, service_id, day = state
+    dashboard.adjust_day(day, sign)
+    if status == 'active':
+        dashboard.adjust(dashboard.ACTIVE_REVENUE, sign * dashboard.service_price(service_id))
+
+
+@receiver(post_init, sender=Appointment)
+def remember_dashboard_state(sender, instance, **kwargs):
+    instance._dashboard_state = _dashboard_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Appointment)
+def update_dashboard_on_save(sender, instance, created, **kwargs):
+    new = _dashboard_state(instance)
+    old = None if created else getattr(instance, '_dashboard_state', None)
+    if created:
+        dashboard.adjust(dashboard.TOTAL_APPOINTMENTS, 1)
+        _apply_dashboard_state(new, 1)
+    elif old is not None and new is not None and old != new:
+        _apply_dashboard_state(old, -1)
+        _apply_dashboard_state(new, 1)
+    instance._dashboard_state = new
+
+
+@receiver(post_delete, sender=Appointment)
+def update_dashboard_on_delete(sender, instance, **kwargs):
+    dashboard.adjust(dashboard.TOTAL_APPOINTMENTS, -1)
+    state = getattr(instance, '_dashboard_state', None) or _dashboard_state(instance)
+    if state is not None:
+        _apply_dashboard_state(state, -1)
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee_active(sender, instance, **kwargs):
+    instance._was_active = instance.__dict__.get('is_active') if instance.pk else None
+
+
+@receiver(post_save, sender=Employee)
+def update_dashboard_employees(sender, instance, created, **kwargs):
+    was_active = False if created else getattr(instance, '_was_active', None)
+    if was_active is not None and was_active != instance.is_active:
+        dashboard.adjust(dashboard.ACTIVE_EMPLOYEES, 1 if instance.is_active else -1)
+    instance._was_active = instance.is_active
+
+
+@receiver(post_delete, sender=Employee)
+def update_dashboard_employees_on_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        dashboard.adjust(dashboard.ACTIVE_EMPLOYEES, -1)
+
+
+def _price(instance):
+    price = instance.__dict__.get('price')
+    return Decimal(str(price)) if price is not None else Decimal('0')
+
+
+@receiver(post_init, sender=Service)
+def remember_service_price(sender, instance, **kwargs):
+    instance._original_price = _price(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Service)
+def update_dashboard_revenue_for_price(sender, instance, created, **kwargs):
+    old_price = getattr(instance, '_original_price', None)
+    new_price = _price(instance)
+    if not created and old_price is not None and old_price != new_price:
+        active = Appointment.objects.filter(services=instance, status='active').count()
+        dashboard.adjust(dashboard.ACTIVE_REVENUE, active * (new_price - old_price))
+    instance._original_price = new_price
+
+
+# Late edits to days that are already rolled up (see reports.py).
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=TimeSlot)
+def remember_rollup_day(sender, instance, **kwargs):
+    instance._rollup_day = _rollup_day(instance) if instance.pk else None
+
+
+def _rollup_day(instance):
+    data = instance.__dict__
+    if isinstance(instance, TimeSlot):
+        return data.get('date')
+    appointment_date = data.get('appointment_date')
+    if appointment_date is None:
+        return None
+    if timezone.is_aware(appointment_date):
+        appointment_date = timezone.localtime(appointment_date)
+    return appointment_date.date()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def mark_rollup_days_dirty(sender, instance, **kwargs):
+    for day in {getattr(instance, '_rollup_day', None), _rollup_day(instance)}:
+        reports.mark_dirty(day)
+    instance._rollup_day = _rollup_day(instance)
+
+
+# Full-text search documents (see search.py). Appointment documents carry
+# the service and employee names, so renaming either refreshes them.
+
+def _search_title(instance):
+    return instance.__dict__.get('service' if isinstance(instance, Service) else 'name')
+
+
+@receiver(post_init, sender=Service)
+@receiver(post_init, sender=Employee)
+def remember_search_title(sender, instance, **kwargs):
+    instance._search_title = _search_title(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Appointment)
+def index_for_search(sender, instance, created, **kwargs):
+    search.index(instance)
+    if sender is Appointment:
+        return
+    title = _search_title(instance)
+    original = getattr(instance, '_search_title', None)
+    if not created and original is not None and original != title:
+        field = 'services_id' if sender is Service else 'employee_id'
+        search.reindex_appointments(**{field: instance.pk})
+    instance._search_title = title
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Appointment)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(instance)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_inbox_version(sender, instance, **kwargs):
+    booking_cache.bump(booking_cache.inbox_key(instance.recipient_id))
+
+
+# Live availability stream (see live.py). Each save logs what a subscriber to
+# that employee's day needs to know; rows loaded with deferred fields are
+# compared only on what they loaded.
+
+def _live_slot(instance):
+    data = instance.__dict__
+    return ((data.get('employee_id'), data.get('date'), data.get('start_time'), data.get('end_time')),
+            data.get('is_booked'), data.get('is_available'))
+
+
+@receiver(post_init, sender=TimeSlot)
+def remember_live_slot(sender, instance, **kwargs):
+    instance._live_slot = _live_slot(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=TimeSlot)
+def record_slot_change(sender, instance, created, **kwargs):
+    place, booked, available = current = _live_slot(instance)
+    original = None if created else getattr(instance, '_live_slot', None)
+    instance._live_slot = current
+    if original is None:
+        if created:
+            live.record('slot.added', instance.employee_id, instance.date, instance.pk)
+        return
+    old_place, was_booked, was_available = original
+    if None not in old_place and old_place != place:
+        live.record('slot.removed', old_place[0], old_place[1], instance.pk)
+        live.record('slot.added', instance.employee_id, instance.date, instance.pk)
+    elif was_booked is not None and was_booked != booked:
+        live.record('slot.booked' if booked else 'slot.released', instance.employee_id, instance.date, instance.pk)
+    elif was_available is not None and was_available != available:
+        live.record('slot.added' if available else 'slot.removed', instance.employee_id, instance.date, instance.pk)
+
+
+@receiver(post_delete, sender=TimeSlot)
+def record_slot_removed(sender, instance, **kwargs):
+    live.record('slot.removed', instance.employee_id, instance.date, instance.pk)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_live_day(sender, instance, **kwargs):
+    instance._live_day = _appointment_day(instance) if instance.pk else None
+    instance._live_owner = instance.__dict__.get('user_id') if instance.pk else None
+
+
+@receiver(post_save, sender=Appointment)
+def record_appointment_saved(sender, instance, **kwargs):
+    day = _appointment_day(instance)
+    original = getattr(instance, '_live_day', None)
+    owner = getattr(instance, '_live_owner', None)
+    if original and (original != day or owner != instance.user_id):
+        # Tell the previous day, and the previous customer, that it has gone.
+        live.record('appointment.saved', *original, appointment_id=instance.pk, user_id=owner)
+    if day:
+        live.record('appointment.saved', *day, appointment_id=instance.pk, user_id=instance.user_id)
+    instance._live_day = day
+    instance._live_owner = instance.user_id
+
+
+@receiver(post_delete, sender=Appointment)
+def record_appointment_cancelled(sender, instance, **kwargs):
+    day = getattr(instance, '_live_day', None) or _appointment_day(instance)
+    if day:
+        live.record('appointment.cancelled', *day, appointment_id=instance.pk, user_id=instance.user_id)
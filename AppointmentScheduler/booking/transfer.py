@@ -0,0 +1,560 @@
+"""Bulk import and export of booking data as CSV or JSON Lines.
+
+Rows name each other by natural key instead of primary key, so a file
+exported from one database imports into another: users by username,
+employees by email, services by name, time slots by (employee, date, start,
+end) and appointments by (user, employee, appointment_date), with the
+appointment's slot given as its date and times. Import the files in the
+order of DATASETS so the keys they refer to exist.
+
+Import reads the file as a stream and works in batches: one query per
+referenced model to resolve keys, one to find the rows that already exist,
+then bulk_create and bulk_update in a transaction. If a batch fails, its
+rows are retried one by one in savepoints so the error report names the bad
+rows and the rest still land. Memory is bounded by the batch size, not the
+file. bulk_create and bulk_update skip the model signals, so the derived
+state they maintain (cache versions, the live slot log, the search index,
+dashboard totals and closed-day rollups) is brought up to date here.
+
+Export reads through ``.iterator(chunk_size=...)`` over ``values_list``,
+writing each row as it arrives.
+"""
+import csv
+import datetime
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, models, router, transaction
+from django.utils import timezone
+
+from . import cache as booking_cache
+from . import dashboard, live, reports, search
+from .models import Appointment, Employee, RollupWatermark, Service, TimeSlot
+
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 1000
+CHUNK_SIZE = 2000
+PROGRESS_SECONDS = 5
+# Error messages kept on the report; the error file, if any, gets them all.
+KEPT_ERRORS = 20
+
+
+class RowError(Exception):
+    pass
+
+
+class Column:
+    """A file column: ``field`` on the model, or the natural key ``ref`` of the model it points to."""
+
+    def __init__(self, name, field=None, ref=None):
+        self.name = name
+        self.field = field or name
+        self.ref = ref
+
+    @property
+    def lookup(self):
+        return f'{self.field}__{self.ref}' if self.ref else self.field
+
+
+def _to_text(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def parse_value(field, value):
+    """Convert a value read from a file for ``field``; blank means the default, or NULL."""
+    text = isinstance(field, (models.CharField, models.TextField))
+    if value == '' and (field.null or not text):
+        value = None
+    if value is not None:
+        try:
+            value = field.to_python(value)
+        except ValidationError as exc:
+            raise RowError(f'{field.name}: {"; ".join(exc.messages)}')
+    if value is None:
+        if field.has_default():
+            return field.get_default()
+        if not field.null:
+            raise RowError(f'{field.name} is required')
+        return None
+    if isinstance(field, models.DateTimeField) and settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    if field.choices and value not in dict(field.flatchoices):
+        raise RowError(f'{field.name}: {value!r} is not a valid choice')
+    try:
+        field.run_validators(value)
+    except ValidationError as exc:
+        raise RowError(f'{field.name}: {"; ".join(exc.messages)}')
+    return value
+
+
+class ImportReport:
+    def __init__(self, errors_file=None):
+        self.read = self.created = self.updated = self.unchanged = self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self._writer = csv.writer(errors_file) if errors_file is not None else None
+        if self._writer:
+            self._writer.writerow(['line', 'error', 'row'])
+
+    def saved(self, created, updated, unchanged):
+        self.created += created
+        self.updated += updated
+        self.unchanged += unchanged
+
+    def error(self, line, message, row):
+        self.failed += 1
+        if len(self.errors) < KEPT_ERRORS:
+            self.errors.append((line, message))
+        if self._writer:
+            self._writer.writerow([line, message, json.dumps(row, default=str)])
+
+    @property
+    def rate(self):
+        return self.read / max(time.perf_counter() - self.started, 1e-9)
+
+
+class Dataset:
+    model = None
+    columns = ()
+    # Names of the columns that identify a row.
+    key = ()
+
+    def __init__(self, include_passwords=False):
+        self.include_passwords = include_passwords
+        self._by_name = {column.name: column for column in self.columns}
+        self.dates = None
+
+    # Export
+
+    def export_columns(self):
+        return [column.name for column in self.columns]
+
+    def export_rows(self, chunk_size=CHUNK_SIZE):
+        names = self.export_columns()
+        lookups = [self._by_name[name].lookup for name in names]
+        rows = self.model._default_manager.order_by('pk').values_list(*lookups)
+        for values in rows.iterator(chunk_size=chunk_size):
+            yield dict(zip(names, values))
+
+    # Import
+
+    def _resolve_refs(self, records):
+        """``{column name: {natural key: pk}}`` for every reference in the batch."""
+        resolved = {}
+        for column in self.columns:
+            if not column.ref:
+                continue
+            wanted = {row.get(column.name) for _, row in records} - {None, ''}
+            related = self.model._meta.get_field(column.field).related_model
+            # Descending, so the lowest pk wins where a natural key is not unique.
+            resolved[column.name] = dict(
+                related._default_manager.filter(**{f'{column.ref}__in': wanted})
+                .order_by('-pk').values_list(column.ref, 'pk'))
+        return resolved
+
+    def instance(self, row, refs):
+        values = {}
+        for column in self.columns:
+            value = row.get(column.name)
+            field = self.model._meta.get_field(column.field)
+            if column.ref:
+                if value in (None, ''):
+                    if not field.null:
+                        raise RowError(f'{column.name} is required')
+                    values[field.attname] = None
+                    continue
+                if value not in refs[column.name]:
+                    raise RowError(f'{column.name} {value!r} does not exist')
+                values[field.attname] = refs[column.name][value]
+            else:
+                values[field.attname] = parse_value(field, value)
+        return self.model(**values)
+
+    def key_fields(self):
+        return [self.model._meta.get_field(self._by_name[name].field).attname for name in self.key]
+
+    def key_of(self, obj):
+        return tuple(getattr(obj, attname) for attname in self.key_fields())
+
+    def existing(self, keys):
+        """``{natural key: {'pk': ..., field: value}}`` for the rows among ``keys`` already stored."""
+        attnames = self.key_fields()
+        queryset = self.model._default_manager.all()
+        for position, attname in enumerate(attnames):
+            values = {key[position] for key in keys}
+            lookup = models.Q(**{f'{attname}__in': values - {None}})
+            if None in values:
+                lookup |= models.Q(**{f'{attname}__isnull': True})
+            queryset = queryset.filter(lookup)
+        # Filtering column by column gives a superset; match whole keys here.
+        stored = {}
+        for row in queryset.order_by('-pk').values('pk', *attnames, *self.update_fields()):
+            stored[tuple(row[attname] for attname in attnames)] = row
+        return {key: stored[key] for key in keys if key in stored}
+
+    def update_fields(self):
+        return [self.model._meta.get_field(column.field).attname for column in self.columns
+                if column.name not in self.key]
+
+    def merge(self, obj, stored):
+        """Fill in what the file left for the stored row to keep, before comparing."""
+
+    def after_update(self, objs):
+        """Note that stored rows changed, which the raw UPDATE does not; runs in the batch's transaction."""
+
+    def after_batch(self, objs):
+        """Bring derived state up to date for a saved batch; runs in its transaction."""
+
+    def finish(self):
+        """Bring whole-table derived state up to date once the import is done."""
+
+    def _track_dates(self, dates):
+        dates = [date for date in dates if date is not None]
+        if dates:
+            lo, hi = min(dates), max(dates)
+            self.dates = (min(lo, self.dates[0]), max(hi, self.dates[1])) if self.dates else (lo, hi)
+
+    def _refresh_rollups(self):
+        """Re-aggregate the closed days the imported rows fall on, where already rolled up."""
+        if self.dates is None:
+            return
+        watermark = RollupWatermark.objects.filter(name=reports.WATERMARK).first()
+        if watermark is None:
+            return
+        end = min(self.dates[1], watermark.filled_through)
+        if self.dates[0] <= end:
+            reports.refresh_days(self.dates[0], end)
+
+
+class UserDataset(Dataset):
+    columns = (
+        Column('username'), Column('email'), Column('first_name'), Column('last_name'),
+        Column('phone_number'), Column('is_employee'), Column('is_staff'), Column('is_active'),
+        Column('date_joined'),
+    )
+    key = ('username',)
+
+    @property
+    def model(self):
+        return get_user_model()
+
+    def export_columns(self):
+        names = super().export_columns()
+        return names + ['password'] if self.include_passwords else names
+
+    def export_rows(self, chunk_size=CHUNK_SIZE):
+        names = self.export_columns()
+        rows = self.model._default_manager.order_by('pk').values_list(*names)
+        for values in rows.iterator(chunk_size=chunk_size):
+            yield dict(zip(names, values))
+
+    def instance(self, row, refs):
+        user = super().instance(row, refs)
+        password = row.get('password')
+        if password:
+            # Only hashes, as exported; never a raw password from a file.
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise RowError('password is not a recognised password hash')
+            user.password = password
+        else:
+            user.password = make_password(None)
+            user._keep_password = True
+        return user
+
+    def update_fields(self):
+        return super().update_fields() + ['password']
+
+    def merge(self, user, stored):
+        if getattr(user, '_keep_password', False):
+            user.password = stored['password']
+
+
+class EmployeeDataset(Dataset):
+    model = Employee
+    columns = (
+        Column('email'), Column('name'), Column('employee_id'), Column('phone_number'),
+        Column('specialization'), Column('years_experience'), Column('bio'), Column('is_active'),
+    )
+    key = ('email',)
+
+    def finish(self):
+        booking_cache.bump(booking_cache.CATALOG_KEY)
+        search.rebuild()
+        dashboard.reconcile()
+
+
+class ServiceDataset(Dataset):
+    model = Service
+    columns = (Column('service'), Column('service_id'), Column('duration'), Column('price'))
+    key = ('service',)
+
+    def finish(self):
+        booking_cache.bump(booking_cache.CATALOG_KEY)
+        search.rebuild()
+        dashboard.reconcile()
+
+
+class TimeSlotDataset(Dataset):
+    model = TimeSlot
+    columns = (
+        Column('employee', ref='email'), Column('date'), Column('start_time'), Column('end_time'),
+        Column('is_available'), Column('is_booked'),
+    )
+    key = ('employee', 'date', 'start_time', 'end_time')
+
+    def after_batch(self, objs):
+        days = {(slot.employee_id, slot.date) for slot in objs}
+        booking_cache.bump(*(booking_cache.day_key(*day) for day in days))
+        live.record_days('slot.added', days)
+        self._track_dates(date for _, date in days)
+
+    def finish(self):
+        self._refresh_rollups()
+
+
+class AppointmentDataset(Dataset):
+    model = Appointment
+    columns = (
+        Column('user', ref='username'), Column('employee', ref='email'), Column('appointment_date'),
+        Column('service', field='services', ref='service'), Column('status'), Column('notes'),
+        Column('appointment_id'),
+    )
+    key = ('user', 'employee', 'appointment_date')
+    SLOT_COLUMNS = ('timeslot_date', 'timeslot_start', 'timeslot_end')
+
+    def export_columns(self):
+        return super().export_columns() + list(self.SLOT_COLUMNS)
+
+    def export_rows(self, chunk_size=CHUNK_SIZE):
+        names = self.export_columns()
+        lookups = [column.lookup for column in self.columns] + [
+            'timeslot__date', 'timeslot__start_time', 'timeslot__end_time']
+        rows = Appointment.objects.order_by('pk').values_list(*lookups)
+        for values in rows.iterator(chunk_size=chunk_size):
+            yield dict(zip(names, values))
+
+    def _resolve_refs(self, records):
+        resolved = super()._resolve_refs(records)
+        employees = {resolved['employee'].get(row.get('employee')) for _, row in records} - {None}
+        dates = set()
+        for _, row in records:
+            try:
+                dates.add(parse_value(TimeSlot._meta.get_field('date'), row.get('timeslot_date')))
+            except RowError:
+                pass  # Reported against the row when it is built.
+        resolved['timeslot'] = {
+            (employee_id, date, start, end): pk
+            for employee_id, date, start, end, pk in
+            TimeSlot.objects.filter(employee_id__in=employees, date__in=dates)
+            .values_list('employee_id', 'date', 'start_time', 'end_time', 'pk')
+        } if employees and dates else {}
+        return resolved
+
+    def instance(self, row, refs):
+        appointment = super().instance(row, refs)
+        slot = [row.get(name) for name in self.SLOT_COLUMNS]
+        if all(value in (None, '') for value in slot):
+            return appointment
+        date = parse_value(TimeSlot._meta.get_field('date'), slot[0])
+        start = parse_value(TimeSlot._meta.get_field('start_time'), slot[1])
+        end = parse_value(TimeSlot._meta.get_field('end_time'), slot[2])
+        appointment.timeslot_id = refs['timeslot'].get((appointment.employee_id, date, start, end))
+        if appointment.timeslot_id is None:
+            raise RowError(f'time slot {date} {start}-{end} does not exist for this employee')
+        return appointment
+
+    def update_fields(self):
+        return super().update_fields() + ['timeslot_id']
+
+    def after_update(self, objs):
+        # What save() would set through auto_now and booking.signals; calendar feeds read both.
+        Appointment.objects.filter(pk__in=[appointment.pk for appointment in objs]).update(
+            updated_at=timezone.now(), sequence=models.F('sequence') + 1)
+
+    def after_batch(self, objs):
+        days = {(appointment.employee_id, timezone.localdate(appointment.appointment_date)) for appointment in objs}
+        booking_cache.bump(
+            booking_cache.ALL_APPOINTMENTS_KEY,
+            *{booking_cache.user_key(appointment.user_id) for appointment in objs},
+            *(booking_cache.day_key(*day) for day in days if day[0] is not None),
+            *{booking_cache.employee_key(employee_id) for employee_id, _ in days if employee_id is not None},
+        )
+        by_user = defaultdict(set)
+        for appointment in objs:
+            if appointment.employee_id is not None:
+                by_user[appointment.user_id].add(
+                    (appointment.employee_id, timezone.localdate(appointment.appointment_date)))
+        for user_id, user_days in by_user.items():
+            live.record_days('appointment.saved', user_days, user_id)
+        self._track_dates(date for _, date in days)
+
+    def finish(self):
+        search.rebuild()
+        dashboard.reconcile()
+        self._refresh_rollups()
+
+
+DATASETS = {
+    'users': UserDataset,
+    'employees': EmployeeDataset,
+    'services': ServiceDataset,
+    'timeslots': TimeSlotDataset,
+    'appointments': AppointmentDataset,
+}
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict or None, error or None)`` from a CSV or JSONL text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f'invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'expected a JSON object'
+            continue
+        yield number, row, None
+
+
+def write_rows(stream, fmt, columns, rows):
+    """Write ``rows`` (dicts) to a text stream; returns how many were written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(['' if row[name] is None else _to_text(row[name]) for name in columns])
+            count += 1
+        return count
+    for row in rows:
+        stream.write(json.dumps({name: _to_text(row[name]) for name in columns}, default=str))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def _update(model, objs, attnames):
+    """Like bulk_update, but one executemany of a plain UPDATE: its CASE WHEN expressions cost more
+    to build than the statements take to run."""
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(attname) for attname in attnames]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(model._meta.db_table), ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(model._meta.pk.column))
+    params = [[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+              for obj in objs]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _save(dataset, batch):
+    """Create or update ``batch``; returns ``(created, updated, unchanged)``."""
+    keys = {}
+    for line, obj in batch:
+        # A key repeated within the batch: the last row wins.
+        keys[dataset.key_of(obj)] = obj
+    stored = dataset.existing(set(keys))
+    fields = dataset.update_fields()
+    creates, updates, unchanged = [], [], 0
+    for key, obj in keys.items():
+        if key not in stored:
+            creates.append(obj)
+            continue
+        dataset.merge(obj, stored[key])
+        obj.pk = stored[key]['pk']
+        obj._state.adding = False
+        if all(getattr(obj, attname) == stored[key][attname] for attname in fields):
+            unchanged += 1
+        else:
+            updates.append(obj)
+    with transaction.atomic():
+        dataset.model._default_manager.bulk_create(creates)
+        if updates:
+            _update(dataset.model, updates, fields)
+            dataset.after_update(updates)
+        dataset.after_batch(creates + updates)
+    return len(creates), len(updates), unchanged
+
+
+def _save_one_by_one(dataset, batch, rows, report):
+    for _, obj in batch:
+        # Forget what the rolled-back attempt assigned; _save looks it up again.
+        obj.pk = None
+        obj._state.adding = True
+    for line, obj in batch:
+        try:
+            with transaction.atomic():
+                counts = _save(dataset, [(line, obj)])
+        except DatabaseError as exc:
+            report.error(line, str(exc), rows[line])
+        else:
+            report.saved(*counts)
+
+
+def _import_batch(dataset, records, report):
+    refs = dataset._resolve_refs(records)
+    batch, rows = [], {}
+    for line, row in records:
+        try:
+            batch.append((line, dataset.instance(row, refs)))
+            rows[line] = row
+        except RowError as exc:
+            report.error(line, str(exc), row)
+    if not batch:
+        return
+    try:
+        counts = _save(dataset, batch)
+    except DatabaseError:
+        _save_one_by_one(dataset, batch, rows, report)
+    else:
+        report.saved(*counts)
+
+
+def import_rows(name, stream, fmt, batch_size=BATCH_SIZE, errors_file=None, progress=None):
+    """Import a CSV or JSONL stream into dataset ``name``; returns an ImportReport."""
+    dataset = DATASETS[name]()
+    report = ImportReport(errors_file)
+    records, reported = [], time.perf_counter()
+    for line, row, error in read_rows(stream, fmt):
+        report.read += 1
+        if error:
+            report.error(line, error, None)
+            continue
+        records.append((line, row))
+        if len(records) >= batch_size:
+            _import_batch(dataset, records, report)
+            records = []
+            if progress and time.perf_counter() - reported >= PROGRESS_SECONDS:
+                progress(report)
+                reported = time.perf_counter()
+    if records:
+        _import_batch(dataset, records, report)
+    dataset.finish()
+    return report
+
+
+def export_rows(name, stream, fmt, chunk_size=CHUNK_SIZE, include_passwords=False):
+    """Write dataset ``name`` to ``stream``; returns how many rows were written."""
+    dataset = DATASETS[name](include_passwords=include_passwords)
+    return write_rows(stream, fmt, dataset.export_columns(), dataset.export_rows(chunk_size))
@@ -13,23 +13,36 @@ urlpatterns = [
     path('service/<int:pk>/delete/', ServiceDeleteView.as_view(), name='service-delete'),
     path('timeslots/', TimeSlotListView.as_view(), name='timeslot-list'),
     path('timeslots/create/', TimeSlotCreateView.as_view(), name='timeslot-create'),
+    path('timeslots/generate/', views.TimeSlotGenerateView.as_view(), name='timeslot-generate'),
     path('timeslots/<int:pk>/update/', TimeSlotUpdateView.as_view(), name='timeslot-update'),
     path('timeslots/<int:pk>/delete/', TimeSlotDeleteView.as_view(), name='timeslot-delete'),
     path('employee/', EmployeeListView.as_view(), name='employee-list'),
     path('employee/create/', EmployeeCreateView.as_view(), name='employee-create'),
     path('employee/<int:pk>/update/', EmployeeUpdateView.as_view(), name='employee-update'),
+    path('employee/<int:pk>/feed/rotate/', views.CalendarFeedRotateView.as_view(), name='employee-feed-rotate'),
     path('employee/<int:pk>/delete/', EmployeeDeleteView.as_view(), name='employee-delete'),
     path('appointments/', AppointmentListView.as_view(), name='appointment-list'),
+    path('appointments/archive/', views.ArchivedAppointmentListView.as_view(), name='appointment-archive'),
     path('appointments/create/', AppointmentCreateView.as_view(), name='appointment-create'),
     path('appointments/<int:pk>/update/', AppointmentUpdateView.as_view(), name='appointment-update'),
     path('appointments/<int:pk>/delete/', AppointmentDeleteView.as_view(), name='appointment-delete'),
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('notifications/unread-count/', views.unread_notification_count, name='notification-unread-count'),
+    path('notifications/mark-all-read/', views.NotificationMarkAllReadView.as_view(), name='notification-mark-all-read'),
+    path('notifications/broadcast/', views.NotificationBroadcastView.as_view(), name='notification-broadcast'),
     path('notifications/create/', NotificationCreateView.as_view(), name='notification-create'),
     path('notifications/<int:pk>/update/', NotificationUpdateView.as_view(), name='notification-update'),
     path('notifications/<int:pk>/delete/', NotificationDeleteView.as_view(), name='notification-delete'),
     path('calendar/', views.CalendarView.as_view(), name='calendar'),
     path('calendar/events/', views.appointment_events, name='calendar_events'),
+    path('calendar/events/async/', views.appointment_events_async, name='calendar_events_async'),
+    path('calendar/feed/rotate/', views.CalendarFeedRotateView.as_view(), name='calendar-feed-rotate'),
+    path('feeds/<str:token>.ics', views.calendar_feed, name='calendar-feed'),
     path('appointments/add/', views.AppointmentCreateAjax.as_view(), name='appointment_add'),
     path('appointments/<int:pk>/edit/', views.AppointmentUpdateAjax.as_view(), name='appointment_edit'),
     path('ajax/load-timeslots/', views.load_timeslots, name='ajax_load_timeslots'),
+    path('ajax/load-timeslots/async/', views.load_timeslots_async, name='ajax_load_timeslots_async'),
+    path('live/slots/', views.live_slot_changes, name='live_slots'),
+    path('ajax/first-available/', views.first_available_slots, name='ajax_first_available'),
+    path('reports/timeseries/', views.revenue_timeseries, name='report-timeseries'),
 ]
\ No newline at end of file
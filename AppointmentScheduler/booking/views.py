@@ -1,12 +1,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView, FormView, View
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin, PermissionRequiredMixin
 from django.urls import reverse_lazy, reverse
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+import datetime
 import json
-
-from .models import Service, Appointment, Employee, TimeSlot, Notification
-from .forms import ServiceForm,AppointmentForm, EmployeeForm, TimeSlotForm, NotificationForm
+from itertools import islice
+
+from .models import Service, Appointment, ArchivedAppointment, CalendarFeed, Employee, TimeSlot, Notification, SlotChange
+from .forms import ServiceForm,AppointmentForm, EmployeeForm, TimeSlotForm, NotificationForm, TimeSlotGenerateForm, NotificationBroadcastForm
+from . import cache as booking_cache
+from . import catalog
+from . import dashboard
+from . import feeds
+from . import live
+from . import notifications
+from . import reports
+from .availability import AvailabilityIndex, first_available
+from .scheduling import generate_timeslots
+from .claims import SlotUnavailable, cancel_appointment, save_appointment
+from .pagination import KeysetPaginationMixin
+from .search import SearchMixin
 
 # Create your views here.
 
@@ -25,29 +48,21 @@ class HomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = timezone.now().date()
-        
-        context['total_appointments'] = Appointment.objects.count()
-        context['upcoming_appointments'] = Appointment.objects.filter(appointment_date__gte=today).count()
-        context['total_employees'] = Employee.objects.filter(is_active=True).count()
-        
-        revenue = Appointment.objects.filter(status='active').aggregate(
-            total_revenue=Sum('services__price')
-        )['total_revenue']
-        context['total_revenue'] = revenue if revenue else 0
-        
+        # Maintained incrementally by booking.signals; see dashboard.reconcile
+        context.update(dashboard.read())
         return context
 
-class ServiceListView(LoginRequiredMixin, ListView):
+class ServiceListView(LoginRequiredMixin, SearchMixin, KeysetPaginationMixin, ListView):
     model = Service
+    keyset_ordering = ('service', 'id')
     context_object_name = 'services'
+    # Set explicitly: the catalog is a list, which names no template.
+    template_name = 'booking/service_list.html'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        q = self.request.GET.get('q')
-        if q:
-            queryset = queryset.filter(service__icontains=q)
-        return queryset
+        if not self.request.GET.get('q', '').strip():
+            return catalog.services()
+        return self.search_queryset(super().get_queryset())
 
 class ServiceCreateView(PermissionRequiredMixin, CreateView):
     model = Service
@@ -69,10 +84,16 @@ class ServiceDeleteView(PermissionRequiredMixin, DeleteView):
     permission_required = 'booking.delete'
     context_object_name = 'service'
 
-class TimeSlotListView(LoginRequiredMixin, ListView):
+class TimeSlotListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = TimeSlot
+    keyset_ordering = ('date', 'start_time', 'id')
     context_object_name = 'timeslots'
 
+    def get_queryset(self):
+        # Exactly the columns timeslot_list.html renders, employee joined in.
+        return super().get_queryset().select_related('employee').only(
+            'date', 'start_time', 'end_time', 'is_booked', 'employee__name')
+
 class TimeSlotCreateView(PermissionRequiredMixin, CreateView):
     model = TimeSlot
     form_class = TimeSlotForm
@@ -80,6 +101,22 @@ class TimeSlotCreateView(PermissionRequiredMixin, CreateView):
     permission_required = 'booking.add-timeslot'
     context_object_name = 'timeslot'
 
+class TimeSlotGenerateView(PermissionRequiredMixin, FormView):
+    form_class = TimeSlotGenerateForm
+    template_name = 'booking/timeslot_generate.html'
+    success_url = reverse_lazy('timeslot-list')
+    permission_required = 'booking.add_timeslot'
+
+    def has_permission(self):
+        # Staff only: one submission can create a year of slots for every employee.
+        return self.request.user.is_staff and super().has_permission()
+
+    def form_valid(self, form):
+        employee_ids = [employee.pk for employee in form.cleaned_data['employees']]
+        report = generate_timeslots(form.cleaned_data['start_date'], form.cleaned_data['end_date'], employee_ids)
+        messages.success(self.request, f"Generated time slots: {report}")
+        return super().form_valid(form)
+
 class TimeSlotUpdateView(PermissionRequiredMixin, UpdateView):
     model = TimeSlot
     form_class = TimeSlotForm
@@ -93,8 +130,9 @@ class TimeSlotDeleteView(PermissionRequiredMixin, DeleteView):
     permission_required = 'booking.delete_timeslot'
     context_object_name = 'timeslot'
 
-class AppointmentListView(LoginRequiredMixin, ListView):
+class AppointmentListView(LoginRequiredMixin, SearchMixin, KeysetPaginationMixin, ListView):
     model = Appointment
+    keyset_ordering = ('appointment_date', 'id')
     context_object_name = 'appointments'
 
     def get_queryset(self):
@@ -106,16 +144,38 @@ class AppointmentListView(LoginRequiredMixin, ListView):
             queryset = Appointment.objects.filter(employee=user.employee)
         else:
             queryset = Appointment.objects.filter(user=user)
-        
-        q = self.request.GET.get('q')
-        if q:
-             queryset = queryset.filter(
-                models.Q(services__service__icontains=q) | 
-                models.Q(employee__name__icontains=q)
-             )
-        return queryset
+        # Exactly the columns appointment_list.html renders, relations joined in.
+        queryset = queryset.select_related('services', 'employee').only(
+            'appointment_date', 'status', 'services__service', 'employee__name')
+        return self.search_queryset(queryset)
     
-class AppointmentCreateView(LoginRequiredMixin, CreateView):
+class ArchivedAppointmentListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Read-only: archived appointments can be browsed but not edited or restored."""
+    model = ArchivedAppointment
+    keyset_ordering = ('-appointment_date', '-id')
+    context_object_name = 'appointments'
+    template_name = 'booking/archived_appointment_list.html'
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_staff:
+            return ArchivedAppointment.objects.all()
+        if hasattr(user, 'employee'):
+            return ArchivedAppointment.objects.filter(employee_id=user.employee.pk)
+        return ArchivedAppointment.objects.filter(user_id=user.pk)
+
+class AppointmentSaveMixin:
+    """Saves AppointmentForm through claims.save_appointment so slot claims stay atomic."""
+
+    def save_appointment(self, form):
+        try:
+            self.object = save_appointment(form, form.original_timeslot)
+        except SlotUnavailable:
+            form.add_error('timeslot', "This time slot has just been booked by someone else.")
+            return False
+        return True
+
+class AppointmentCreateView(LoginRequiredMixin, AppointmentSaveMixin, CreateView):
     model = Appointment
     form_class = AppointmentForm
     success_url = reverse_lazy('appointment-list')
@@ -125,13 +185,11 @@ class AppointmentCreateView(LoginRequiredMixin, CreateView):
         user = self.request.user
         # Automatically assign the logged-in user to the appointment
         form.instance.user = user
-        response = super().form_valid(form)
-        if self.object.timeslot:
-            self.object.timeslot.is_booked = True
-            self.object.timeslot.save()
-        return response
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
+        return redirect(self.get_success_url())
     
-class AppointmentUpdateView(UserPassesTestMixin, UpdateView):
+class AppointmentUpdateView(UserPassesTestMixin, AppointmentSaveMixin, UpdateView):
     model = Appointment
     form_class = AppointmentForm
     success_url = reverse_lazy('appointment-list')
@@ -141,6 +199,11 @@ class AppointmentUpdateView(UserPassesTestMixin, UpdateView):
         obj = self.get_object()
         return self.request.user.is_staff or obj.user == self.request.user
 
+    def form_valid(self, form):
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
+        return redirect(self.get_success_url())
+
 class AppointmentDeleteView(UserPassesTestMixin, DeleteView):
     model = Appointment
     success_url = reverse_lazy('appointment-list')
@@ -152,10 +215,7 @@ class AppointmentDeleteView(UserPassesTestMixin, DeleteView):
 
     def form_valid(self, form):
         success_url = self.get_success_url()
-        if self.object.timeslot:
-             self.object.timeslot.is_booked = False
-             self.object.timeslot.save()
-        self.object.delete()
+        cancel_appointment(self.object)
         return redirect(success_url)
     
 
@@ -169,16 +229,16 @@ class EmployeeCreateView(LoginRequiredMixin, CreateView):
     def test_func(self):
         return self.request.user.is_staff
     
-class EmployeeListView(LoginRequiredMixin, ListView):
+class EmployeeListView(LoginRequiredMixin, SearchMixin, KeysetPaginationMixin, ListView):
     model = Employee
+    keyset_ordering = ('name', 'id')
     context_object_name = 'employees'
+    template_name = 'booking/employee_list.html'
 
     def get_queryset(self):
-        queryset = self.model.objects.filter(is_active=True)
-        q = self.request.GET.get('q')
-        if q:
-            queryset = queryset.filter(name__icontains=q)
-        return queryset
+        if not self.request.GET.get('q', '').strip():
+            return catalog.active_employees()
+        return self.search_queryset(self.model.objects.filter(is_active=True))
     
 # class EmployeeDetailView(LoginRequiredMixin, DetailView):
 #     model = Employee
@@ -197,6 +257,13 @@ class EmployeeUpdateView(LoginRequiredMixin, UpdateView):
 
      def test_func(self):
         return self.request.user.is_staff
+
+     def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Only for those who may see every appointment anyway.
+        if self.request.user.has_perm('booking.view_appointment'):
+            context['feed_url'] = _feed_url(self.request, feeds.feed_for(employee=self.object))
+        return context
      
    
 class EmployeeDeleteView(LoginRequiredMixin, DeleteView):
@@ -209,19 +276,56 @@ class EmployeeDeleteView(LoginRequiredMixin, DeleteView):
         return self.model.objects.filter(is_active=True)
     
 
-class NotificationListView(LoginRequiredMixin, ListView):
+class NotificationListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Notification
-    context_object_name = 'notification-list'
+    template_name = 'notifications/notifications_list.html'
+    keyset_ordering = ('-created_at', '-id')
+    context_object_name = 'notifications'
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_staff or hasattr(user, 'employee'):
-            return Notification.objects.all()
-        return Notification.objects.filter(user=user)
+        # Everyone reads their own inbox; ?unread=1 narrows it to unread ones.
+        queryset = Notification.objects.filter(recipient=self.request.user)
+        if self.request.GET.get('unread'):
+            queryset = queryset.filter(is_read=False)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['unread_count'] = notifications.unread_count(self.request.user.pk)
+        return context
+
+class NotificationMarkAllReadView(LoginRequiredMixin, View):
+    def post(self, request):
+        updated = notifications.mark_all_read(request.user.pk)
+        messages.success(request, f"Marked {updated} notification{'s' if updated != 1 else ''} as read.")
+        return redirect('notification-list')
+
+class NotificationBroadcastView(PermissionRequiredMixin, FormView):
+    form_class = NotificationBroadcastForm
+    template_name = 'notifications/notification_broadcast.html'
+    success_url = reverse_lazy('notification-list')
+    permission_required = 'booking.add_notification'
+
+    def form_valid(self, form):
+        sent = notifications.broadcast(form.recipient_ids(), form.cleaned_data['notification_type'],
+                                       form.cleaned_data['message'])
+        messages.success(self.request, f"Sent to {sent} recipient{'s' if sent != 1 else ''}.")
+        return super().form_valid(form)
+
+def _unread_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    return booking_cache.etag_for('unread', request.user.pk, notifications.inbox_version(request.user.pk))
+
+@login_required
+@condition(etag_func=_unread_etag)
+def unread_notification_count(request):
+    return JsonResponse({'unread': notifications.unread_count(request.user.pk)})
     
 class NotificationCreateView(PermissionRequiredMixin, CreateView):
     model = Notification
     form_class = NotificationForm
+    template_name = 'notifications/notification_form.html'
     success_url = reverse_lazy('notification-list')
     permission_required = 'booking.add_notification'
     context_object_name = 'notification'
@@ -229,12 +333,14 @@ class NotificationCreateView(PermissionRequiredMixin, CreateView):
 class NotificationUpdateView(PermissionRequiredMixin, UpdateView):
     model = Notification
     form_class = NotificationForm
+    template_name = 'notifications/notification_form.html'
     success_url = reverse_lazy('notification-list')
     permission_required = 'booking.change_notification'
     context_object_name = 'notification'
 
 class NotificationDeleteView(PermissionRequiredMixin, DeleteView):
     model = Notification
+    template_name = 'notifications/notification_confirm_delete.html'
     success_url = reverse_lazy('notification-list')
     permission_required = 'booking.delete_notification'
     context_object_name = 'notification'
@@ -245,37 +351,198 @@ class NotificationDeleteView(PermissionRequiredMixin, DeleteView):
 class CalendarView(LoginRequiredMixin, TemplateView):
     template_name = 'appointments/calendar.html'
 
-def appointment_events(request):
-    user = request.user
-    if user.has_perm('booking.view_appointment'):
-        appointments = Appointment.objects.all()
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['feed_url'] = _feed_url(self.request, feeds.feed_for(user=self.request.user))
+        return context
+
+def _feed_url(request, feed):
+    return request.build_absolute_uri(reverse('calendar-feed', args=[feed.token]))
+
+class CalendarFeedRotateView(LoginRequiredMixin, View):
+    def post(self, request, pk=None):
+        if pk is None:
+            feed, success_url = feeds.feed_for(user=request.user), reverse('calendar')
+        else:
+            if not request.user.has_perm('booking.view_appointment'):
+                raise PermissionDenied
+            employee = get_object_or_404(Employee, pk=pk)
+            feed, success_url = feeds.feed_for(employee=employee), reverse('employee-update', args=[pk])
+        feeds.rotate(feed)
+        messages.success(request, "The calendar feed link has been reset. Subscribe again with the new one.")
+        return redirect(success_url)
+
+def _calendar_feed(request, token):
+    # Memoized on the request: the etag and last-modified hooks and the view all need it.
+    if not hasattr(request, '_calendar_feed'):
+        feed = CalendarFeed.objects.select_related('employee').filter(token=token).first()
+        request._calendar_feed = (feed, feeds.versions(feed) if feed else None)
+    return request._calendar_feed
+
+def _feed_etag(request, token):
+    feed, versions = _calendar_feed(request, token)
+    return feeds.etag(feed, versions) if feed else None
+
+def _feed_last_modified(request, token):
+    feed, versions = _calendar_feed(request, token)
+    return booking_cache.last_modified_for(versions) if feed else None
+
+# No login: calendar apps present the token instead.
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def calendar_feed(request, token):
+    feed, _ = _calendar_feed(request, token)
+    if feed is None:
+        raise Http404
+    name = f"{feed.employee.name}'s appointments" if feed.employee_id else 'My appointments'
+    response = StreamingHttpResponse(feeds.render(feed, name), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    # Private to the token's owner, and always revalidated: the ETag makes that a 304.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _parse_calendar_bound(value):
+    # FullCalendar sends either a bare date or an ISO datetime with an offset
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(value)
+        dt = datetime.datetime.combine(d, datetime.time.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+def _event_json(a):
+    if a['timeslot__date']:
+        start_time = f"{a['timeslot__date']}T{a['timeslot__start_time']}"
+        end_time = f"{a['timeslot__date']}T{a['timeslot__end_time']}"
     else:
-        appointments = Appointment.objects.filter(user=user)
-
-    events = []
-    for a in appointments:
-        start_time = None
-        end_time = None
-        
-        if a.timeslot:
-            start_time = f'{a.timeslot.date}T{a.timeslot.start_time}'
-            end_time = f'{a.timeslot.date}T{a.timeslot.end_time}'
-        elif a.appointment_date:
-            start_time = a.appointment_date.isoformat()
-            # Default to 1 hour duration if no timeslot/duration available
-            end_time = (a.appointment_date + __import__('datetime').timedelta(hours=1)).isoformat()
-            
-        if start_time and a.services and a.employee:
-            events.append({
-                'title': f'{a.services.service} with {a.employee.name}',
-                'start': start_time,
-                'end': end_time,
-                'url': f'/appointments/appointments/{a.id}/update/',
-                'color': '#3498db' if a.status=='active' else '#e67e22',
-            })
-    return JsonResponse(events, safe=False)
-
-class AppointmentCreateAjax(LoginRequiredMixin, CreateView):
+        start_time = a['appointment_date'].isoformat()
+        # Default to 1 hour duration if no timeslot/duration available
+        end_time = (a['appointment_date'] + datetime.timedelta(hours=1)).isoformat()
+    return json.dumps({
+        'title': f"{a['services__service']} with {a['employee__name']}",
+        'start': start_time,
+        'end': end_time,
+        'url': f"/appointments/appointments/{a['id']}/update/",
+        'color': '#3498db' if a['status'] == 'active' else '#e67e22',
+    })
+
+def _serialize_events(rows):
+    yield '['
+    first = True
+    for a in rows:
+        event = _event_json(a)
+        yield event if first else ',' + event
+        first = False
+    yield ']'
+
+async def _aserialize_events(rows):
+    yield '['
+    first = True
+    async for a in rows:
+        event = _event_json(a)
+        yield event if first else ',' + event
+        first = False
+    yield ']'
+
+def _events_scope(user, sees_all):
+    if sees_all:
+        return 'all', booking_cache.ALL_APPOINTMENTS_KEY
+    return f'user-{user.pk}', booking_cache.user_key(user.pk)
+
+def _event_rows(request, scope, user):
+    """The events query for the calendar window in ``request``; raises ValueError on a bad bound."""
+    start = _parse_calendar_bound(request.GET.get('start'))
+    end = _parse_calendar_bound(request.GET.get('end'))
+    appointments = Appointment.objects.all() if scope == 'all' else Appointment.objects.filter(user=user)
+    # appointment_date mirrors the timeslot start (see AppointmentForm.clean),
+    # so the visible window can be applied on a single indexed column.
+    if start:
+        appointments = appointments.filter(appointment_date__gte=start)
+    if end:
+        appointments = appointments.filter(appointment_date__lt=end)
+    return appointments.filter(
+        services__isnull=False, employee__isnull=False,
+    ).values(
+        'id', 'status', 'appointment_date',
+        'timeslot__date', 'timeslot__start_time', 'timeslot__end_time',
+        'services__service', 'employee__name',
+    ).order_by('appointment_date', 'id')
+
+def _events_etag_for(request, scope, versions):
+    return booking_cache.etag_for(scope, *versions, request.GET.get('start'), request.GET.get('end'))
+
+def _events_versions(request):
+    # Memoized on the request: the etag and last-modified hooks both need it.
+    if not hasattr(request, '_events_versions'):
+        scope, scope_key = _events_scope(request.user, request.user.has_perm('booking.view_appointment'))
+        request._events_versions = (scope, booking_cache.get_versions(scope_key, booking_cache.CATALOG_KEY))
+    return request._events_versions
+
+def _events_etag(request):
+    return _events_etag_for(request, *_events_versions(request))
+
+def _events_last_modified(request):
+    return booking_cache.last_modified_for(_events_versions(request)[1])
+
+@login_required
+@condition(etag_func=_events_etag, last_modified_func=_events_last_modified)
+def appointment_events(request):
+    scope, _ = _events_versions(request)
+    try:
+        rows = _event_rows(request, scope, request.user)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start/end range.'}, status=400)
+
+    cache_key = f'booking:events:{_events_etag(request)}'
+    payload = cache.get(cache_key)
+    if payload is not None:
+        return HttpResponse(payload, content_type='application/json')
+    return StreamingHttpResponse(
+        booking_cache.cache_stream(_serialize_events(rows.iterator(chunk_size=500)), cache_key),
+        content_type='application/json',
+    )
+
+async def _aevents_versions(request):
+    if not hasattr(request, '_events_versions'):
+        user = await request.auser()
+        scope, scope_key = _events_scope(user, await user.ahas_perm('booking.view_appointment'))
+        request._events_versions = (scope, await booking_cache.aget_versions(scope_key, booking_cache.CATALOG_KEY))
+    return request._events_versions
+
+async def _aevents_etag(request):
+    return _events_etag_for(request, *await _aevents_versions(request))
+
+async def _aevents_last_modified(request):
+    return booking_cache.last_modified_for((await _aevents_versions(request))[1])
+
+@login_required
+@booking_cache.async_condition(_aevents_etag, _aevents_last_modified)
+async def appointment_events_async(request):
+    """appointment_events for ASGI deployments, on its own route.
+
+    Under WSGI every call is adapted through async_to_sync, and even under ASGI
+    bench_async_reads measured it slower than the sync view, so it is not the default.
+    """
+    scope, _ = await _aevents_versions(request)
+    try:
+        rows = _event_rows(request, scope, await request.auser())
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start/end range.'}, status=400)
+
+    cache_key = f'booking:events:{await _aevents_etag(request)}'
+    payload = await cache.aget(cache_key)
+    if payload is not None:
+        return HttpResponse(payload, content_type='application/json')
+    return StreamingHttpResponse(
+        booking_cache.acache_stream(_aserialize_events(rows.aiterator(chunk_size=500)), cache_key),
+        content_type='application/json',
+    )
+
+class AppointmentCreateAjax(LoginRequiredMixin, AppointmentSaveMixin, CreateView):
     model = Appointment
     form_class = AppointmentForm
     template_name = 'appointments/appointment_form_partial.html'
@@ -288,10 +555,12 @@ class AppointmentCreateAjax(LoginRequiredMixin, CreateView):
         return initial
 
     def form_valid(self, form):
-        form.save()
+        form.instance.user = self.request.user
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
         return JsonResponse({'success': True, 'redirect': True})
 
-class AppointmentUpdateAjax(UserPassesTestMixin, UpdateView):
+class AppointmentUpdateAjax(UserPassesTestMixin, AppointmentSaveMixin, UpdateView):
     model = Appointment
     form_class = AppointmentForm
     template_name = 'appointments/appointment_form_partial.html'
@@ -301,19 +570,208 @@ class AppointmentUpdateAjax(UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff or obj.user == self.request.user
 
     def form_valid(self, form):
-        form.save()
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
         return JsonResponse({'success': True, 'redirect': True})
 
+def _timeslots_day(request):
+    try:
+        employee_id = int(request.GET.get('employee_id', ''))
+        date = parse_date(request.GET.get('date', ''))
+    except ValueError:
+        return None
+    return (employee_id, date) if date else None
+
+def _timeslots_service(request):
+    try:
+        return int(request.GET['service_id'])
+    except (KeyError, ValueError):
+        return None
+
+def _timeslot_options(index, employee_id, date, duration, unbooked):
+    """The load-timeslots payload rows; ``unbooked`` is only read when there is no duration."""
+    if duration:
+        # Only offer starts where the whole service fits before the next booking.
+        slots = [opening._asdict() for opening in index.openings(employee_id, date, duration)]
+        for slot in slots:
+            slot['id'] = slot.pop('slot_id')
+        return slots
+    # Still leave out slots that another booking's service runs into.
+    free = index.free_slot_ids(employee_id, date)
+    return [slot for slot in unbooked if slot['id'] in free]
+
+def _unbooked_timeslots(employee_id, date):
+    return TimeSlot.objects.filter(
+        employee_id=employee_id, date=date, is_booked=False,
+    ).order_by('start_time').values('id', 'start_time', 'end_time')
+
+def _service_duration(service_id):
+    return Service.objects.filter(pk=service_id).values_list('duration', flat=True)
+
+def _timeslots_etag_for(request, versions):
+    if versions is None:
+        return None
+    return booking_cache.etag_for(*_timeslots_day(request), _timeslots_service(request), *versions)
+
+def _timeslots_versions(request):
+    if not hasattr(request, '_timeslots_versions'):
+        day = _timeslots_day(request)
+        request._timeslots_versions = booking_cache.get_versions(
+            booking_cache.day_key(*day), booking_cache.CATALOG_KEY,
+        ) if day else None
+    return request._timeslots_versions
+
+def _timeslots_etag(request):
+    return _timeslots_etag_for(request, _timeslots_versions(request))
+
+def _timeslots_last_modified(request):
+    versions = _timeslots_versions(request)
+    return booking_cache.last_modified_for(versions) if versions is not None else None
+
+@condition(etag_func=_timeslots_etag, last_modified_func=_timeslots_last_modified)
 def load_timeslots(request):
-    employee_id = request.GET.get('employee_id')
-    date_str = request.GET.get('date')
-    timeslots = TimeSlot.objects.none()
-    
-    if employee_id and date_str:
+    day = _timeslots_day(request)
+    if day is None:
+        return JsonResponse([], safe=False)
+
+    cache_key = f'booking:timeslots:{_timeslots_etag(request)}'
+    payload = cache.get(cache_key)
+    if payload is None:
+        employee_id, date = day
+        service_id = _timeslots_service(request)
+        duration = _service_duration(service_id).first() if service_id is not None else None
+        index = AvailabilityIndex.for_employee_day(employee_id, date)
+        slots = _timeslot_options(index, employee_id, date, duration, _unbooked_timeslots(employee_id, date))
+        payload = json.dumps(slots, cls=DjangoJSONEncoder)
+        cache.set(cache_key, payload, booking_cache.PAYLOAD_TIMEOUT)
+    return HttpResponse(payload, content_type='application/json')
+
+async def _atimeslots_versions(request):
+    if not hasattr(request, '_timeslots_versions'):
+        day = _timeslots_day(request)
+        request._timeslots_versions = await booking_cache.aget_versions(
+            booking_cache.day_key(*day), booking_cache.CATALOG_KEY,
+        ) if day else None
+    return request._timeslots_versions
+
+async def _atimeslots_etag(request):
+    return _timeslots_etag_for(request, await _atimeslots_versions(request))
+
+async def _atimeslots_last_modified(request):
+    versions = await _atimeslots_versions(request)
+    return booking_cache.last_modified_for(versions) if versions is not None else None
+
+@booking_cache.async_condition(_atimeslots_etag, _atimeslots_last_modified)
+async def load_timeslots_async(request):
+    """load_timeslots for ASGI deployments, on its own route; see appointment_events_async."""
+    day = _timeslots_day(request)
+    if day is None:
+        return JsonResponse([], safe=False)
+
+    cache_key = f'booking:timeslots:{await _atimeslots_etag(request)}'
+    payload = await cache.aget(cache_key)
+    if payload is None:
+        employee_id, date = day
+        service_id = _timeslots_service(request)
+        duration = await _service_duration(service_id).afirst() if service_id is not None else None
+        index = await AvailabilityIndex.afor_employee_day(employee_id, date)
+        unbooked = [] if duration else [slot async for slot in _unbooked_timeslots(employee_id, date)]
+        slots = _timeslot_options(index, employee_id, date, duration, unbooked)
+        payload = json.dumps(slots, cls=DjangoJSONEncoder)
+        await cache.aset(cache_key, payload, booking_cache.PAYLOAD_TIMEOUT)
+    return HttpResponse(payload, content_type='application/json')
+
+
+LIVE_KINDS = {kind for kind, _ in SlotChange.KIND_CHOICES}
+
+def _live_filters(request):
+    employee_ids = [int(value) for value in request.GET.getlist('employee_id') if value.isdigit()]
+    dates = []
+    for value in request.GET.getlist('date'):
         try:
-            # Parse date if necessary, but standard YYYY-MM-DD works with Django filters
-            timeslots = TimeSlot.objects.filter(employee_id=employee_id, date=date_str, is_booked=False).order_by('start_time')
-        except Exception as e:
-            pass # Invalid data
-            
-    return JsonResponse(list(timeslots.values('id', 'start_time', 'end_time')), safe=False)
\ No newline at end of file
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date:
+            dates.append(date)
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in LIVE_KINDS]
+    return employee_ids, dates, kinds
+
+@login_required
+async def live_slot_changes(request):
+    """Server-sent events for slot availability; see live.py."""
+    employee_ids, dates, kinds = _live_filters(request)
+    # Like the calendar events: only those who may see every appointment hear about everyone's.
+    user = await request.auser()
+    user_id = None if await user.ahas_perm('booking.view_appointment') else user.pk
+    # EventSource sends the header on reconnect; the query parameter covers a fresh page load.
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id', '')
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+    if isinstance(request, WSGIRequest):
+        # A WSGI worker would buffer the endless async stream and never send a byte.
+        body = live.poll_stream(employee_ids, dates, last_event_id, kinds=kinds, user_id=user_id)
+    else:
+        body = live.stream(employee_ids, dates, last_event_id, kinds=kinds, user_id=user_id)
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+FIRST_AVAILABLE_MAX_DAYS = 60
+FIRST_AVAILABLE_MAX_RESULTS = 50
+
+@login_required
+def first_available_slots(request):
+    try:
+        service = Service.objects.get(pk=int(request.GET.get('service_id', '')))
+        days = min(int(request.GET.get('days', 14)), FIRST_AVAILABLE_MAX_DAYS)
+        limit = min(int(request.GET.get('limit', 5)), FIRST_AVAILABLE_MAX_RESULTS)
+    except (ValueError, Service.DoesNotExist):
+        return JsonResponse({'error': 'A valid service_id is required.'}, status=400)
+
+    employees = Employee.objects.filter(is_active=True)
+    specialization = request.GET.get('specialization')
+    if specialization:
+        employees = employees.filter(specialization__iexact=specialization)
+    names = dict(employees.values_list('id', 'name'))
+
+    now = timezone.localtime()
+    candidates = first_available(service.duration, sorted(names), now.date(), max(days, 1),
+                                 not_before=now.replace(tzinfo=None))
+    results = [
+        {
+            'employee_id': employee_id,
+            'employee': names[employee_id],
+            'id': opening.slot_id,
+            'date': date,
+            'start_time': opening.start_time,
+            'end_time': opening.end_time,
+        }
+        for date, employee_id, opening in islice(candidates, max(limit, 1))
+    ]
+    return JsonResponse(results, safe=False)
+
+
+REPORT_MAX_DAYS = 3 * 366
+
+@login_required
+def revenue_timeseries(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only.'}, status=403)
+    today = timezone.localdate()
+    try:
+        start = parse_date(request.GET.get('start', '')) or today - datetime.timedelta(days=30)
+        end = parse_date(request.GET.get('end', '')) or today
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be real dates (YYYY-MM-DD).'}, status=400)
+    bucket = request.GET.get('bucket', 'day')
+    group = request.GET.get('group', 'total')
+    if bucket not in reports.BUCKETS or group not in reports.GROUPS:
+        return JsonResponse({'error': f'bucket must be one of {reports.BUCKETS}, group one of {reports.GROUPS}.'}, status=400)
+    if start > end or (end - start).days > REPORT_MAX_DAYS:
+        return JsonResponse({'error': f'Give a start before end, at most {REPORT_MAX_DAYS} days apart.'}, status=400)
+
+    series, filled_through = reports.timeseries(start, end, bucket, group, today=today)
+    return JsonResponse({'start': start, 'end': end, 'bucket': bucket, 'group': group,
+                         'filled_through': filled_through, 'series': series})